@@ -0,0 +1,189 @@
+"""
+Measures loading songs with LoadPipeline against a local stand-in for youtube, no network needed.
+Songs are wav files served by a local http server that answers after a delay, searches take a delay too and the
+first download of every fifth song fails, so retries are part of the measurement. Audio is converted with ffmpeg
+like YoutubeExtractor does, ffmpeg has to be on PATH.
+A load run again with the journal of a load interrupted half way should only search and download the other half.
+Memory is measured loading queries streamed from a generator with an extractor that writes empty files instantly.
+
+usage: python -m benchmarks.load [songs] [seconds of audio per song]
+"""
+import functools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.parse
+import urllib.request
+import wave
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from term_music.extractor import YoutubeExtractor
+from term_music.library_index import LibraryIndex
+from term_music.load_journal import LoadJournal
+from term_music.load_pipeline import LoadPipeline
+
+LATENCY = 0.05  # seconds a search or a request to the server takes
+DEVNULL = open(os.devnull, "w")  # progress isn't part of the measurements
+
+
+class SlowHandler(SimpleHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(LATENCY)
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalExtractor(YoutubeExtractor):
+    """
+    Finds song {query}.wav on the local server, conversion is inherited
+    """
+
+    def __init__(self, folder, base_url):
+        super().__init__(folder, quiet=True)
+        self.base_url = base_url
+        self.attempts = {}
+        self.searches = 0
+        self.lock = threading.Lock()
+
+    def search(self, query):
+        with self.lock:
+            self.searches += 1
+        time.sleep(LATENCY)
+        return query, query.title(), f"{self.base_url}/{urllib.parse.quote(query)}.wav"
+
+    def download(self, url):
+        with self.lock:
+            attempt = self.attempts[url] = self.attempts.get(url, 0) + 1
+        if attempt == 1 and len(self.attempts) % 5 == 0:
+            raise IOError(f"connection to {url} reset")
+        title = urllib.parse.unquote(os.path.basename(url))[:-4].title()
+        os.makedirs(self.staging, exist_ok=True)
+        path = os.path.join(self.staging, title + self.DOWNLOAD_SUFFIX + ".wav")
+        with urllib.request.urlopen(url) as response, open(path, "wb") as f:
+            f.write(response.read())
+        return title, path
+
+
+class InstantExtractor:
+    def __init__(self, folder):
+        self.folder = folder
+        self.staging = os.path.join(folder, YoutubeExtractor.STAGING_FOLDER)
+        os.makedirs(self.staging, exist_ok=True)
+
+    @staticmethod
+    def search(query):
+        return query, query.title(), query
+
+    def download(self, url):
+        path = os.path.join(self.staging, url + ".download")
+        open(path, "w").close()
+        return url.title(), path
+
+    def convert(self, source, filename, place=None):
+        if place:
+            place(source, filename)
+        else:
+            os.replace(source, os.path.join(self.folder, filename))
+
+
+def synthetic_songs(folder, count, seconds, rate=22050, seed=1):
+    rng = random.Random(seed)
+    noise = bytes(rng.getrandbits(8) for _ in range(rate * 2))
+    queries = []
+    for i in range(count):
+        query = f"song number {i}"
+        with wave.open(os.path.join(folder, query + ".wav"), "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(rate)
+            w.writeframes(noise * seconds)
+        queries.append(query)
+    return queries
+
+
+def run(queries, base_url, **settings):
+    with tempfile.TemporaryDirectory() as library:
+        index = LibraryIndex(":memory:", library)
+        pipeline = LoadPipeline(index, LocalExtractor(library, base_url), progress_stream=DEVNULL, **settings)
+        pipeline.RETRY_DELAY = 0.01
+        start = time.perf_counter()
+        titles = list(pipeline.load(queries))
+        elapsed = time.perf_counter() - start
+        pipeline.shutdown()
+        assert titles == [query.title() for query in queries], "titles are out of order or missing"
+        assert len(index.filenames("song")) == len(queries)
+        return elapsed, pipeline.progress.retried
+
+
+def run_resumed(queries, base_url):
+    """
+    Loads the first half of queries, then all of them with the same journal, returns searches and downloads of the
+    second load
+    """
+    with tempfile.TemporaryDirectory() as library:
+        index = LibraryIndex(":memory:", library)
+        journal = LoadJournal(os.path.join(library, "load.db"))
+        for part in (queries[:len(queries) // 2], queries):
+            extractor = LocalExtractor(library, base_url)
+            pipeline = LoadPipeline(index, extractor, progress_stream=DEVNULL, journal=journal)
+            pipeline.RETRY_DELAY = 0.01
+            titles = list(pipeline.load(part))
+            pipeline.shutdown()
+        journal.close()
+        assert titles == [query.title() for query in queries], "titles are out of order or missing"
+        return extractor.searches, len(extractor.attempts)
+
+
+def peak_memory(count):
+    """
+    Peak memory traced while loading count queries
+    """
+    with tempfile.TemporaryDirectory() as library:
+        index = LibraryIndex(":memory:", library)
+        journal = LoadJournal(os.path.join(library, "load.db"))
+        pipeline = LoadPipeline(index, InstantExtractor(library), progress_stream=DEVNULL, journal=journal)
+        tracemalloc.start()
+        loaded = sum(1 for title in pipeline.load(f"song {i}" for i in range(count)) if title)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        pipeline.shutdown()
+        journal.close()
+        assert loaded == count
+        return peak
+
+
+def measure(count, seconds):
+    with tempfile.TemporaryDirectory() as server_folder:
+        queries = synthetic_songs(server_folder, count, seconds)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(SlowHandler, directory=server_folder))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        try:
+            sequential, _ = run(queries, base_url, download_workers=1, convert_workers=1, max_pending=1)
+            concurrent, retried = run(queries, base_url)
+            searched, downloaded = run_resumed(queries, base_url)
+        finally:
+            server.shutdown()
+    return {
+        "songs": count,
+        "seconds_per_song": seconds,
+        "cores": os.cpu_count(),
+        "retried": retried,
+        "sequential_s": sequential,
+        "pipeline_s": concurrent,
+        "resumed_searches": searched,
+        "resumed_downloads": downloaded,
+        "peak_memory_kb": {queries: peak_memory(queries) // 1024 for queries in (1000, 10000)},
+    }
+
+
+if __name__ == "__main__":
+    arguments = [int(argument) for argument in sys.argv[1:3]]
+    print(json.dumps(measure(*arguments, *(40, 30)[len(arguments):]), indent=2))
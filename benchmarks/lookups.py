@@ -0,0 +1,116 @@
+"""
+Measures loading and playing songs that were looked up before with the lookup cache, against a fake youtube that
+takes a delay to search and download and counts how often it is asked.
+Songs are loaded once, then loaded again with the same queries written differently and with other queries that find
+the same videos. With the cache the second loads shouldn't ask youtube at all, or only search it.
+
+usage: python -m benchmarks.lookups [songs]
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from term_music.app_data import Data
+from term_music.domain.music_library import MusicLibrary
+from term_music.extractor import YoutubeExtractor
+from term_music.library_index import LibraryIndex
+from term_music.load_pipeline import LoadPipeline
+from term_music.lookup_cache import LookupCache
+
+LATENCY = 0.05  # seconds a search or a download takes
+DEVNULL = open(os.devnull, "w")  # progress isn't part of the measurements
+
+
+class FakeExtractor:
+    """
+    Finds video song-{n} for any query ending with number n, downloads write empty files
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.staging = os.path.join(folder, YoutubeExtractor.STAGING_FOLDER)
+        os.makedirs(self.staging, exist_ok=True)
+        self.searches = 0
+        self.downloads = 0
+        self.lock = threading.Lock()
+
+    def search(self, query):
+        with self.lock:
+            self.searches += 1
+        time.sleep(LATENCY)
+        number = query.split()[-1]
+        return f"song-{number}", f"Song {number}", f"https://youtube.invalid/song-{number}"
+
+    def download(self, url):
+        with self.lock:
+            self.downloads += 1
+        time.sleep(LATENCY)
+        title = url.rsplit("/", 1)[1].replace("-", " ").title()
+        path = os.path.join(self.staging, title + ".download")
+        open(path, "w").close()
+        return title, path
+
+    def convert(self, source, filename, place=None):
+        if place:
+            place(source, filename)
+        else:
+            os.replace(source, os.path.join(self.folder, filename))
+
+
+def load(library, index, lookups, queries):
+    """
+    Loads queries with a fresh extractor, returns (seconds, searches, downloads)
+    """
+    extractor = FakeExtractor(library)
+    pipeline = LoadPipeline(index, extractor, progress_stream=DEVNULL, lookups=lookups)
+    start = time.perf_counter()
+    titles = list(pipeline.load(queries))
+    elapsed = time.perf_counter() - start
+    pipeline.shutdown()
+    assert None not in titles, "songs failed to load"
+    return {"s": elapsed, "searches": extractor.searches, "downloads": extractor.downloads}
+
+
+def play(library, index, lookups, queries):
+    """
+    Looks queries up the way play does when they aren't found in the library, returns (seconds, searches, downloads)
+    """
+    extractor = FakeExtractor(library)
+    music_lib = MusicLibrary(Data(), library, index, extractor, lookups)
+    start = time.perf_counter()
+    titles = [music_lib.search_and_download(query) for query in queries]
+    elapsed = time.perf_counter() - start
+    assert None not in titles
+    return {"s": elapsed, "searches": extractor.searches, "downloads": extractor.downloads}
+
+
+def measure(count):
+    queries = [f"artist {i % 7} song number {i}" for i in range(count)]
+    # the same queries typed differently
+    retyped = [f"  {query.upper()} " for query in queries]
+    # other queries finding the same videos
+    others = [f"another upload of song {i}" for i in range(count)]
+    results = {"songs": count, "latency_s": LATENCY}
+    for cached in (False, True):
+        with tempfile.TemporaryDirectory() as library:
+            index = LibraryIndex(":memory:", library)
+            lookups = LookupCache(os.path.join(library, "lookups.db")) if cached else None
+            runs = {"first": load(library, index, lookups, queries)}
+            if cached:
+                # a new run opens the cache written by the first one
+                lookups.close()
+                lookups = LookupCache(os.path.join(library, "lookups.db"))
+            runs["retyped"] = load(library, index, lookups, retyped)
+            runs["other_queries"] = load(library, index, lookups, others)
+            if cached:
+                runs["play_retyped"] = play(library, index, lookups, retyped[:20])
+                lookups.close()
+            results["cached" if cached else "uncached"] = runs
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(measure(*[int(argument) for argument in sys.argv[1:2]] or [100]), indent=2))
@@ -0,0 +1,60 @@
+"""
+Measures memory used per queued song and time of common play queue operations on a large synthetic queue.
+Paths are built the way MusicLibrary.play_all builds them, a new string for every queued song.
+
+usage: python -m benchmarks.play_queue [songs]
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from term_music.app_data import Data
+
+
+def paths(count, folder="/home/user/.term-music/music-lib"):
+    return (os.path.join(folder, f"Artist {i % 997} - Song title number {i}.mp3") for i in range(count))
+
+
+def fill(data, count, passes):
+    for _ in range(passes):
+        for path in paths(count):
+            data.add_song(path)
+
+
+def measure_memory(count, passes):
+    tracemalloc.start()
+    data = Data()
+    fill(data, count, passes)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / data.length()
+
+
+def timed(func, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def measure(count):
+    data = Data()
+    add_time = timed(lambda: fill(data, count, 1))
+    data.set_current(count // 2)
+    return {
+        "songs": count,
+        "bytes_per_song": measure_memory(count, 1),
+        "bytes_per_song_queued_twice": measure_memory(count, 2),
+        "add_song_us": add_time / count * 1e6,
+        "insert_after_current_us": timed(lambda: data.insert_song_after_current("/tmp/inserted.mp3"), 1000) * 1e6,
+        "path_at_us": timed(lambda: data.path_at(count // 3), 10000) * 1e6,
+        "get_song_names_ms": timed(data.get_song_names, 10) * 1e3,
+        "shuffle_ms": timed(data.shuffle, 3) * 1e3,
+        "dedupe_ms": timed(data.dedupe) * 1e3,
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(measure(int(sys.argv[1]) if len(sys.argv) > 1 else 50000), indent=2))
@@ -0,0 +1,62 @@
+"""
+Measures cpu time used by Player per minute of playback.
+A silent wav file is played with pygame's dummy audio driver, so no sound card is needed.
+
+usage: python -m benchmarks.player_cpu [seconds]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import wave
+from threading import Event, Thread
+
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
+
+from term_music.app_data import Data
+from term_music.player import Player
+
+
+def write_silence(path, seconds, rate=44100):
+    with wave.open(path, "wb") as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(b"\0" * int(seconds * rate) * 4)
+
+
+def measure(seconds):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "silence.wav")
+        write_silence(path, seconds)
+        data = Data()
+        ended = Event()
+        player = Player(data, ended.set)
+        result = {}
+
+        def run():
+            start = time.thread_time()
+            player.run()
+            result["player_thread_cpu"] = time.thread_time() - start
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        thread = Thread(target=run)
+        thread.start()
+        player.play(path)
+        ended.wait()
+        player.quit()
+        thread.join()
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+    return {
+        "seconds_played": wall,
+        "player_thread_cpu_per_minute": result["player_thread_cpu"] / wall * 60,
+        "process_cpu_per_minute": cpu / wall * 60,
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(measure(float(sys.argv[1]) if len(sys.argv) > 1 else 10), indent=2))
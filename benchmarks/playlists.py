@@ -0,0 +1,79 @@
+"""
+Measures listing songs with the playlists they are on (ls --full) on a synthetic library of empty song files and
+playlists of random songs, against the scan of every playlist for every song it replaced.
+
+usage: python -m benchmarks.playlists [songs] [playlists] [songs per playlist]
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from term_music.library_index import LibraryIndex, SONG, PLAYLIST
+from term_music.domain.playlist import Playlist
+
+
+def synthetic_library(folder, songs, playlists, length, seed=1):
+    rng = random.Random(seed)
+    titles = [f"Artist {i % 397} - Song title number {i}" for i in range(songs)]
+    for title in titles:
+        open(os.path.join(folder, title + ".mp3"), "w").close()
+    for i in range(playlists):
+        Playlist(folder, f"Playlist {i}.txt", rng.sample(titles, min(length, songs))).save()
+
+
+def scan(index: LibraryIndex):
+    """
+    Song to playlists map built the way it was before the index, every song looked up in every playlist
+    """
+    playlists = [Playlist.load(index.folder, filename) for filename in index.filenames(PLAYLIST)]
+    song_playlists = {}
+    for song in index.titles(SONG):
+        for playlist in playlists:
+            if song in playlist.song_titles:
+                song_playlists.setdefault(song, []).append(playlist.playlist_name)
+    return song_playlists
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def measure(songs, playlists, length):
+    with tempfile.TemporaryDirectory() as folder:
+        synthetic_library(folder, songs, playlists, length)
+        db_path = os.path.join(folder, "library.db")
+        index = LibraryIndex(db_path, folder)
+        index.refresh()
+        expected, scan_s = timed(lambda: scan(index))
+        found, first_s = timed(index.song_playlists)
+        assert {song: playlists for song, playlists in found.items() if playlists} == expected
+        _, warm_s = timed(index.song_playlists)
+        index.close()
+        # playlists were indexed by the previous run
+        index = LibraryIndex(db_path, folder)
+        _, reopened_s = timed(index.song_playlists)
+        title = next(iter(expected))
+        _, containing_s = timed(lambda: index.playlists_containing(title))
+        _, orphans_s = timed(index.orphans)
+        index.close()
+    return {
+        "songs": songs,
+        "playlists": playlists,
+        "songs_per_playlist": length,
+        "scan_s": scan_s,
+        "first_index_s": first_s,
+        "indexed_s": warm_s,
+        "reopened_s": reopened_s,
+        "containing_ms": containing_s * 1e3,
+        "orphans_ms": orphans_s * 1e3,
+    }
+
+
+if __name__ == "__main__":
+    arguments = [int(argument) for argument in sys.argv[1:4]]
+    print(json.dumps(measure(*arguments, *(20000, 500, 100)[len(arguments):]), indent=2))
@@ -0,0 +1,68 @@
+"""
+Measures what profiling costs the hot paths: a span and a lock acquire with the profiler disabled and enabled, and
+the time to export a trace of a song's worth of render frames.
+
+usage: python -m benchmarks.profiler [spans]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from threading import Lock
+
+from term_music.profiler import Profiler
+
+
+def per_call_ns(func, count):
+    start = time.perf_counter_ns()
+    for _ in range(count):
+        func()
+    return (time.perf_counter_ns() - start) / count
+
+
+def span_cost(profiler, count):
+    def span():
+        with profiler.span("render frame", "ui"):
+            pass
+    return per_call_ns(span, count)
+
+
+def lock_cost(profiler, count):
+    lock = profiler.wrap_lock(Lock(), "lock")
+
+    def acquire():
+        with lock:
+            pass
+    return per_call_ns(acquire, count)
+
+
+def measure(count):
+    disabled = Profiler()
+    enabled = Profiler()
+    enabled.enable()
+    results = {
+        "spans": count,
+        "empty_loop_ns": per_call_ns(lambda: None, count),
+        "span_disabled_ns": span_cost(disabled, count),
+        "span_enabled_ns": span_cost(enabled, count),
+        "lock_disabled_ns": lock_cost(disabled, count),
+        "lock_enabled_ns": lock_cost(enabled, count),
+    }
+    # four minutes of frames at 60 fps
+    frames = Profiler()
+    frames.enable()
+    for index in range(4 * 60 * 60):
+        with frames.span("render frame", "ui", index=index):
+            pass
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "trace.json")
+        start = time.perf_counter()
+        frames.export(path)
+        results["export_4_min_song_ms"] = (time.perf_counter() - start) * 1e3
+        results["trace_4_min_song_kb"] = os.path.getsize(path) // 1024
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(measure(int(sys.argv[1]) if len(sys.argv) > 1 else 200000), indent=2))
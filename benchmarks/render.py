@@ -0,0 +1,76 @@
+"""
+Measures rendering of a song with UserInterface.render, headless: frames are written to a MemorySink and follow a
+SimulatedClock, so no terminal or audio device is needed and every run draws and drops the same frames.
+Reports render throughput, bytes written per frame and frames dropped when drawing a frame takes longer than the
+frame rate allows, for a few simulated drawing costs.
+
+usage: python -m benchmarks.render [seconds of audio]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
+
+from blessed import Terminal
+from pydub import AudioSegment
+
+from benchmarks.synthetic import tone
+from term_music.app_data import Data
+from term_music.clock import SimulatedClock
+from term_music.frame_stream import FrameStream
+from term_music.screen import MemorySink
+from term_music.ui import UserInterface
+
+# milliseconds a frame takes to draw, on top of the real drawing which the simulated clock doesn't see
+DRAW_COSTS = [0, 10, 20, 40]
+
+
+def user_interface(data, draw_cost=0.0, mode=UserInterface.WAVE):
+    sink = MemorySink()
+    terminal = Terminal(kind="xterm-256color", stream=sink, force_styling=True)
+    return UserInterface(data, terminal, mode=mode, output=sink, clock=SimulatedClock(draw_cost)), sink
+
+
+def render(data, frames, draw_cost=0.0):
+    ui, sink = user_interface(data, draw_cost)
+    duration = ui.frames_duration(frames)
+    start = time.perf_counter()
+    assert ui.render(FrameStream.of(frames), duration) is None, "render was interrupted"
+    return ui, sink, time.perf_counter() - start
+
+
+def measure(seconds):
+    data = Data()
+    for i in range(40):
+        data.add_song(f"/music/Artist {i} - Song {i}.mp3")
+    data.inc_current()
+    with tempfile.TemporaryDirectory() as folder:
+        segment = AudioSegment.from_wav(tone(os.path.join(folder, "tone.wav"), seconds))
+    results = {"seconds": seconds}
+    for mode in (UserInterface.WAVE, UserInterface.SPECTRUM):
+        ui, _ = user_interface(data, mode=mode)
+        frames = ui.get_frames(segment)
+        ui, sink, elapsed = render(data, frames)
+        results[mode] = {
+            "frames": len(frames),
+            "drawn": ui.drawn_frames,
+            "frames_per_s": ui.drawn_frames / elapsed,
+            "bytes_per_frame": sink.bytes_written() / ui.drawn_frames,
+            # the song list is on the screen next to the visualizer
+            "screen": sink.lines()[:3],
+        }
+        if mode == UserInterface.WAVE:
+            wave_frames = frames
+    drops = {}
+    for cost in DRAW_COSTS:
+        ui, _, _ = render(data, wave_frames, cost / 1000)
+        drops[f"{cost}ms"] = {"drawn": ui.drawn_frames, "skipped": ui.skipped_frames, "fps": round(1 / ui.interval, 2)}
+    results["draw_cost"] = drops
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(measure(int(sys.argv[1]) if len(sys.argv) > 1 else 30), indent=2))
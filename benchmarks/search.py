@@ -0,0 +1,52 @@
+"""
+Measures build time of the title search index and query latency on synthetic titles.
+
+usage: python -m benchmarks.search [titles]
+"""
+import json
+import random
+import sys
+import time
+
+from term_music.search_index import SearchIndex
+
+
+def synthetic_titles(count, seed=1):
+    rng = random.Random(seed)
+    words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9))) for _ in range(3000)]
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(2, 6))).title() + f" {i}" for i in range(count)]
+
+
+def best_time(func, repeat=50):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def measure(count):
+    titles = synthetic_titles(count)
+    start = time.perf_counter()
+    index = SearchIndex(titles)
+    build = time.perf_counter() - start
+    word = titles[7].split()[1].lower()
+    queries = {
+        "exact": titles[500],
+        "prefix": titles[777][:12],
+        "word": word,
+        "substring": word[1:4],
+        "typo": word[1] + word[0] + word[2:],
+        "two_letters": word[:2],
+        "no_match": "zzzzqqq",
+    }
+    return {
+        "titles": count,
+        "build_s": build,
+        "query_ms": {name: best_time(lambda: index.search(query, limit=10)) * 1e3 for name, query in queries.items()},
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(measure(int(sys.argv[1]) if len(sys.argv) > 1 else 100000), indent=2))
@@ -0,0 +1,79 @@
+"""
+Measures startup of the command line for subcommands that don't play songs, each run in a fresh interpreter with
+-X importtime against a synthetic library in a temporary home folder. Reports median wall time, time spent importing
+and which of the heavy modules (pygame, blessed, numpy, pydub, youtube_dl) were imported.
+Importing the player app is measured on its own, for comparison.
+
+usage: python -m benchmarks.startup [runs per command]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HEAVY = ["pygame", "blessed", "numpy", "pydub", "youtube_dl"]
+COMMANDS = [
+    ["--version"],
+    ["ls"],
+    ["ls", "--full"],
+    ["search", "song 12"],
+    ["load"],
+]
+
+
+def synthetic_home(home, songs=500):
+    folder = os.path.join(home, ".term-music", "music-lib")
+    os.makedirs(folder)
+    for i in range(songs):
+        open(os.path.join(folder, f"Artist {i % 37} - Song {i}.mp3"), "w").close()
+    with open(os.path.join(folder, "Favourites.txt"), "w") as f:
+        f.write("\n".join(f"Artist {i % 37} - Song {i}" for i in range(0, songs, 7)))
+
+
+def run(home, args):
+    """
+    Returns (wall seconds, import seconds, top level packages imported) of one run
+    """
+    env = dict(os.environ, HOME=home, SDL_AUDIODRIVER="dummy")
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", "-m", "term_music.main", *args], env=env,
+                             stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - start
+    imports = 0
+    modules = set()
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.add(name.strip().split(".")[0])
+        # top level imports aren't indented, nested ones are counted in them
+        if not name.startswith("  "):
+            imports += int(cumulative)
+    return elapsed, imports / 1e6, modules
+
+
+def measure(runs):
+    results = {}
+    with tempfile.TemporaryDirectory() as home:
+        synthetic_home(home)
+        # the first run writes the config and indexes the library
+        run(home, ["ls"])
+        for args in COMMANDS:
+            samples = [run(home, args) for _ in range(runs)]
+            results[" ".join(args)] = {
+                "wall_s": statistics.median(sample[0] for sample in samples),
+                "import_s": statistics.median(sample[1] for sample in samples),
+                "heavy_imports": [module for module in HEAVY if module in samples[0][2]],
+            }
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import term_music.app"], check=True,
+                       env=dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="hide"))
+        results["import term_music.app"] = {"wall_s": time.perf_counter() - start}
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(measure(*[int(argument) for argument in sys.argv[1:2]] or [5]), indent=2))
@@ -0,0 +1,151 @@
+"""
+Times the hot paths of the player and the library on a synthetic library in a temporary folder, see
+benchmarks.synthetic. Runs offline and without an audio device, frames are drawn to a terminal writing to a null
+stream. Results are printed as JSON along with the git revision, so runs on different commits can be compared.
+
+usage: python -m benchmarks.suite [songs] [playlists] [seconds per song]
+"""
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
+
+from blessed import Terminal
+from pydub import AudioSegment
+
+from benchmarks.synthetic import synthetic_library, tone
+from term_music import util
+from term_music.app_data import Data
+from term_music.domain.music_library import MusicLibrary
+from term_music.domain.playlist import Playlist
+from term_music.library_index import LibraryIndex
+from term_music.ui import UserInterface
+
+
+class NullStream:
+    """
+    Discards what is written, counts the characters
+    """
+
+    def __init__(self):
+        self.written = 0
+
+    def write(self, text):
+        self.written += len(text)
+
+    def flush(self):
+        pass
+
+
+def timed(func, repeat=1):
+    """
+    Returns milliseconds func took, best of repeat runs
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1e3
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {"p50": statistics.median(samples), "p99": samples[int(len(samples) * 0.99)], "max": samples[-1]}
+
+
+def revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__)).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def measure_frames(wav):
+    segment = AudioSegment.from_wav(wav)
+    results = {}
+    frames = {}
+    for mode in (UserInterface.WAVE, UserInterface.SPECTRUM):
+        ui = UserInterface(Data(), Terminal(stream=NullStream()), mode=mode)
+        frames[mode] = ui.get_frames(segment)
+        results[mode] = {"frames": len(frames[mode]), "get_frames_ms": timed(lambda: ui.get_frames(segment), 5)}
+    # spectrum of a tone doesn't change, wave frames of it do
+    return results, frames[UserInterface.WAVE]
+
+
+def measure_render(data, frames):
+    """
+    Draws every frame the way render does, with the song list next to the visualizer
+    """
+    stream = NullStream()
+    ui = UserInterface(data, Terminal(kind="xterm-256color", stream=stream, force_styling=True))
+    ui.screen.stream = stream
+    duration = ui.format_time(ui.frames_duration(frames))
+    costs = []
+    for index, frame in enumerate(frames):
+        start = time.perf_counter()
+        ui.draw_frame(frame)
+        ui.draw_song_list(data.snapshot(), duration, ui.format_time(index / ui.fps))
+        ui.screen.flush()
+        costs.append((time.perf_counter() - start) * 1e3)
+    return {"frames": len(frames), "frame_ms": percentiles(costs), "bytes_per_frame": stream.written / len(frames)}
+
+
+def measure_library(folder, titles, names):
+    index = LibraryIndex(os.path.join(folder, "library.db"), folder)
+    music_lib = MusicLibrary(Data(), folder, index)
+    results = {
+        "index_scan_ms": timed(index.refresh),
+        "songs_ms": timed(music_lib.songs, 5),
+    }
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        results["print_songs_and_playlists_ms"] = timed(music_lib.print_songs_and_playlists, 3)
+    queries = ["song number 1", "artist 5", "nothing like it"]
+    results["util_search_ms"] = {query: timed(lambda: util.search(query, titles), 5) for query in queries}
+    music_lib.prepare_song_search()
+    results["search_song_ms"] = {query: timed(lambda: music_lib.search_song(query), 5) for query in queries}
+    filenames = [Playlist.filename(name) for name in names]
+    results["playlist_load_ms"] = timed(lambda: [Playlist.load(folder, filename) for filename in filenames], 3)
+    index.close()
+    return results
+
+
+def measure_queue(paths):
+    data = Data()
+    count = len(paths)
+    results = {"add_song_ms": timed(lambda: [data.add_song(path) for path in paths])}
+    data.set_current(count // 2)
+    results.update({
+        "snapshot_us": timed(data.snapshot, 1000) * 1e3,
+        "insert_after_current_us": timed(lambda: data.insert_song_after_current(paths[0]), 1000) * 1e3,
+        "path_at_us": timed(lambda: data.path_at(count // 3), 1000) * 1e3,
+        "inc_current_us": timed(data.inc_current, 1000) * 1e3,
+        "get_song_names_ms": timed(data.get_song_names, 3),
+        "shuffle_ms": timed(data.shuffle, 3),
+        "dedupe_ms": timed(data.dedupe, 3),
+    })
+    return results, data
+
+
+def measure(songs, playlists, seconds):
+    results = {"revision": revision(), "songs": songs, "playlists": playlists, "seconds_per_song": seconds}
+    with tempfile.TemporaryDirectory() as folder:
+        titles, names = synthetic_library(folder, songs, playlists, seconds=seconds)
+        results["library"] = measure_library(folder, titles, names)
+        results["queue"], data = measure_queue([os.path.join(folder, title + ".mp3") for title in titles])
+        with tempfile.TemporaryDirectory() as audio:
+            results["get_frames"], frames = measure_frames(tone(os.path.join(audio, "tone.wav"), seconds))
+        results["render"] = measure_render(data, frames)
+    return results
+
+
+if __name__ == "__main__":
+    arguments = [int(argument) for argument in sys.argv[1:4]]
+    print(json.dumps(measure(*arguments, *(5000, 200, 10)[len(arguments):]), indent=2))
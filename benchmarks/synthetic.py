@@ -0,0 +1,59 @@
+"""
+Synthetic music libraries for benchmarks: short sine tone songs and playlists of random songs and varying length.
+Every song is a copy of the same tone encoded to mp3 with ffmpeg, without ffmpeg on PATH songs are empty files, which
+is enough for everything that doesn't decode them.
+"""
+import os
+import random
+import shutil
+import subprocess
+import wave
+
+import numpy as np
+
+from term_music.domain.playlist import Playlist
+
+
+def tone(path, seconds, frequency=440, rate=44100, channels=2):
+    """
+    Writes a 16 bit wav file of a sine tone
+    """
+    t = np.arange(int(seconds * rate)) / rate
+    samples = (np.sin(2 * np.pi * frequency * t) * 0.5 * (2 ** 15 - 1)).astype(np.int16)
+    with wave.open(path, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(np.repeat(samples, channels).tobytes())
+    return path
+
+
+def song_titles(count):
+    return [f"Artist {i % 97} - Synthetic song number {i}" for i in range(count)]
+
+
+def synthetic_library(folder, songs, playlists, max_length=100, seconds=3, seed=1):
+    """
+    Writes songs and playlists of 1 to max_length songs to folder, returns (song titles, playlist names)
+    """
+    rng = random.Random(seed)
+    titles = song_titles(songs)
+    source = None
+    if shutil.which("ffmpeg"):
+        wav = tone(os.path.join(folder, "tone.wav"), seconds)
+        source = os.path.join(folder, "tone.tmp")
+        subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-i", wav, "-f", "mp3", source], check=True,
+                       stdin=subprocess.DEVNULL)
+        os.remove(wav)
+    for title in titles:
+        path = os.path.join(folder, title + ".mp3")
+        if source:
+            shutil.copyfile(source, path)
+        else:
+            open(path, "w").close()
+    if source:
+        os.remove(source)
+    names = [f"Playlist {i}" for i in range(playlists)]
+    for name in names:
+        Playlist(folder, Playlist.filename(name), rng.sample(titles, rng.randint(1, min(max_length, songs)))).save()
+    return titles, names
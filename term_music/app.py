@@ -1,7 +1,8 @@
-import time
+import os
 import traceback
+from queue import Queue
 from threading import Thread
-from typing import Optional
+from typing import List
 
 from blessed import Terminal
 from pygame import mixer
@@ -9,22 +10,62 @@ from pygame import mixer
 from term_music.app_data import Data
 from term_music.domain.music_library import MusicLibrary
 from term_music.domain.song import Song
+from term_music.frame_cache import FrameCache
+from term_music.frame_stream import FrameStream
 from term_music.keyboard import Keyboard
+from term_music.library_watcher import LibraryWatcher
+from term_music.memory_cache import MemoryCache
 from term_music.player import Player
+from term_music.prefetch import Prefetcher
+from term_music.profiler import PROFILER
+from term_music.type_ahead import TypeAhead
 from term_music.ui import UserInterface
 
 
 class App:
+    """
+    Main thread handles track changes and prompts, playback, rendering and keyboard input run on long-lived workers.
+    Workers talk to the main thread through events.
+    """
+    SONG_ENDED = "SONG_ENDED"
+    SONG_ADVANCED = "SONG_ADVANCED"
+    QUEUE_CHANGED = "QUEUE_CHANGED"
+    QUERY_CHOSEN = "QUERY_CHOSEN"
+    QUERY_REMOTE = "QUERY_REMOTE"
+    QUERY_CANCELLED = "QUERY_CANCELLED"
+    EXIT = "EXIT"
 
     def __init__(self, data: Data, music_lib: MusicLibrary, config):
         self.music_lib = music_lib
         self.data = data
-        self.player = Player(data)
+        # waits for the data locks show up in the profile, workers don't run yet so swapping them is safe
+        data.current_lock = PROFILER.wrap_lock(data.current_lock, "data current_lock")
+        data.selected_lock = PROFILER.wrap_lock(data.selected_lock, "data selected_lock")
+        self.player = Player(data, lambda: self.post(self.SONG_ENDED), lambda: self.post(self.SONG_ADVANCED),
+                             **config.player_settings)
         self.terminal = Terminal()
         self.ui = UserInterface(data, self.terminal, **config.ui_settings)
-        self.ui_thread: Optional[Thread] = None
-        self.play_thread: Optional[Thread] = None
-        self.keyboard_thread: Optional[Thread] = None
+        cache_settings = config.cache_settings
+        self.frame_cache = FrameCache(os.path.join(config.cache_dir, "frames"),
+                                      cache_settings["frame_cache_mb"] * 1024 * 1024)
+        # (frame stream, duration) of recently played songs, streams are accounted for at their full size right away
+        self.frame_streams = MemoryCache(cache_settings["frames_memory_mb"] * 1024 * 1024,
+                                         lambda entry: max(entry[0].nbytes(), self.ui.frames_nbytes(entry[1])),
+                                         lambda entry: entry[0].close())
+        # prefetched frames shouldn't push frames of the playing song out of memory
+        self.prefetcher = Prefetcher(data, self.load_frames, cache_settings["prefetch_depth"],
+                                     min(cache_settings["prefetch_memory_mb"] * 1024 * 1024,
+                                         self.frame_streams.max_size // 2),
+                                     cache_settings["prefetch_workers"])
+        # events for the main thread, put by workers
+        self.events = Queue()
+        self.playing = False
+        self.workers: List[Thread] = []
+        # songs added to the library while the app runs can be found without scanning the folder
+        self.watcher = LibraryWatcher(music_lib.index)
+        # library is searched while the query is typed, results take the song list area but its first and last line
+        self.type_ahead = TypeAhead(data, lambda text, limit: music_lib.search_song(text, limit=limit),
+                                    max(self.ui.height - 2, 1), music_lib.prepare_song_search)
         self.keyboard = Keyboard(data, self.terminal,
                                  {key: getattr(self, value) for key, value in config.keymap.items()})
 
@@ -32,63 +73,100 @@ class App:
         self.data.add_song(path)
 
     def play_audio(self, song: Song):
-        self.play_thread = Thread(target=self.player.play, args=[song.path])
+        self.player.play(song.path)
+        self.playing = True
         self.start_ui(song)
-        self.play_thread.start()
+        self.queue_next()
+        self.prefetcher.prefetch()
 
-    def load_ui(self, song: Song):
-        audio = song.audio()
-        frames = self.ui.get_frames(audio)
-        self.ui_thread = Thread(target=self.ui.render, args=[frames, audio.duration_seconds])
+    def queue_next(self):
+        """
+        Hands the next song to the player ahead of time, so it starts without a gap or fades in
+        """
+        if not (self.player.gapless or self.player.crossfade):
+            return
+        snapshot = self.data.snapshot()
+        if snapshot.current + 1 < snapshot.length():
+            self.player.queue(snapshot.path_at(snapshot.current + 1))
+
+    def advance(self):
+        """
+        Follows the player after it moved on to the queued song by itself
+        """
+        self.data.inc_current()
+        index, song = self.data.current()
+        self.data.set_selected(index)
+        self.start_ui(song)
+        self.queue_next()
+        self.prefetcher.prefetch()
+
+    def load_frames(self, song: Song):
+        """
+        Returns frame stream of the song and its duration.
+        Streams stay in memory after the song was played, so going back to a song doesn't decode it again.
+        """
+        key = self.frame_cache.key(song.path, *self.ui.frame_settings())
+        if key is None:
+            return self.create_frames(song, key)
+        frames = self.frame_streams.get_or_create(key, lambda: self.create_frames(song, key))
+        for stat, value in self.frame_streams.stats().items():
+            PROFILER.counter(f"frame streams {stat}", value, "cache")
+        return frames
+
+    def create_frames(self, song: Song, key):
+        frames = self.frame_cache.get(key)
+        if frames is not None:
+            return FrameStream.of(frames), self.ui.frames_duration(frames)
+
+        # frames are computed while the song plays and cached once all of them were computed
+        frames = FrameStream(lambda start: self.ui.song_frames(song, start), self.ui.width, self.ui.frame_dtype,
+                             lambda computed: self.frame_cache.put(key, computed))
+        return frames, song.duration()
 
     def start_ui(self, song: Song):
-        self.load_ui(song)
-        self.ui.unpause()
-        self.ui_thread.start()
+        self.ui.show(*self.load_frames(song))
 
     def restart_ui(self):
-        self.player.pause()
-        song = self.data.current()[1][mixer.music.get_pos():]
-        self.start_ui(song)
-        self.player.unpause()
+        # ui follows the playback position, showing the song again is enough to resync
+        self.start_ui(self.data.current()[1])
 
     def stop(self):
         self.player.stop()
-        self.ui.terminate()
 
     def pause(self):
         if mixer.music.get_busy():
             self.player.pause()
-            self.ui.pause()
 
     def restart(self):
         self.player.unpause()
-        self.ui.unpause()
 
-    def start_keyboard(self):
-        self.keyboard_thread = Thread(target=self.keyboard.listen, daemon=True, name="KEYBOARD")
-        self.keyboard_thread.start()
+    def post(self, event):
+        self.events.put(event)
 
-    def wait_keyboard(self):
-        if self.keyboard.is_blocking:
-            print("press any key to continue")
-        if self.keyboard_thread and self.keyboard_thread.is_alive():
-            self.keyboard_thread.join()
+    def start_workers(self):
+        self.workers = [Thread(target=self.player.run, daemon=True, name="PLAYER"),
+                        Thread(target=self.ui.run, daemon=True, name="RENDERER"),
+                        Thread(target=self.keyboard.listen, daemon=True, name="KEYBOARD"),
+                        Thread(target=self.watcher.run, daemon=True, name="WATCHER"),
+                        Thread(target=self.type_ahead.run, daemon=True, name="SEARCH")]
+        for worker in self.workers:
+            worker.start()
 
-    def wait_ui(self):
-        if self.ui_thread and self.ui_thread.is_alive():
-            self.ui_thread.join()
+    def stop_workers(self):
+        self.player.quit()
+        self.ui.quit()
+        self.keyboard.stop()
+        self.watcher.stop()
+        self.type_ahead.stop()
+        for worker in self.workers:
+            worker.join()
 
-    def wait_player(self):
-        if self.play_thread and self.play_thread.is_alive():
-            self.play_thread.join()
-
-    def restart_keyboard(self):
-        self.wait_keyboard()
-        self.start_keyboard()
-
-    def is_playing(self):
-        return self.play_thread and self.play_thread.is_alive()
+    def take_terminal(self):
+        """
+        Stops keyboard listener and renderer so the main thread can prompt for input
+        """
+        self.keyboard.disable()
+        self.ui.hide()
 
     def get_no_songs_prompt(self):
         prompts = ["No songs to play", "p - play all songs in music library", "q - enter query mode"]
@@ -98,71 +176,137 @@ class App:
         prompts.append("press any key to exit: ")
         return "\n".join(prompts)
 
+    def start_query(self):
+        """
+        Keys typed from now on are the query, can be called from the keyboard thread
+        """
+        self.data.query_mode()
+        self.type_ahead.start()
+        self.keyboard.set_handler(self.query_key)
+
+    def end_query(self):
+        self.keyboard.set_handler(None)
+        self.data.normal_mode()
+
+    def query_key(self, key):
+        """
+        Handles a key typed in query mode, called from the keyboard thread
+        """
+        query = self.data.get_query()
+        if query is None:
+            return
+        text = query.text
+        if key.is_sequence:
+            if key.name == "KEY_ENTER":
+                self.post(self.QUERY_CHOSEN)
+            elif key.name == "KEY_TAB":
+                self.post(self.QUERY_REMOTE)
+            elif key.name == "KEY_ESCAPE":
+                self.post(self.QUERY_CANCELLED)
+            elif key.name in ("KEY_BACKSPACE", "KEY_DELETE"):
+                self.type_ahead.type(text[:-1])
+            elif key.name == "KEY_UP":
+                self.data.inc_query_selected(-1)
+            elif key.name == "KEY_DOWN":
+                self.data.inc_query_selected()
+        elif key.isprintable():
+            self.type_ahead.type(text + key)
+
+    def play_next(self, title):
+        self.music_lib.play_song(title, True)
+        if self.playing:
+            # player reports the end of the song, then the queried song is played as the next one
+            self.stop()
+
+    def choose_query(self):
+        title = self.data.get_query().chosen()
+        if title is not None:
+            self.end_query()
+            self.play_next(title)
+
+    def remote_query(self):
+        """
+        Searches youtube for the typed query and downloads the song found, asking first
+        """
+        text = self.data.get_query().text
+        self.end_query()
+        self.take_terminal()
+        print(f"Searching youtube for {text}")
+        title = self.music_lib.search_and_download(text, ask=True)
+        if title:
+            self.play_next(title)
+        elif self.playing:
+            input("No song found, press enter to return to player: ")
+            self.restart_ui()
+        self.keyboard.enable()
+
+    def handle(self, event):
+        if event == self.SONG_ENDED:
+            self.playing = False
+        elif event == self.SONG_ADVANCED:
+            self.advance()
+        elif event == self.QUEUE_CHANGED:
+            # songs after the current one changed, queued and prefetched ones may be stale
+            self.queue_next()
+            self.prefetcher.prefetch()
+        elif event == self.QUERY_CHOSEN:
+            self.choose_query()
+        elif event == self.QUERY_REMOTE:
+            self.remote_query()
+        elif event == self.QUERY_CANCELLED:
+            self.end_query()
+
+    def no_songs(self):
+        self.take_terminal()
+        self.data.reset_current()
+        mode = input(self.get_no_songs_prompt())
+        if mode == "p":
+            self.music_lib.play_all()
+            self.keyboard.enable()
+        elif mode == "q":
+            self.start_query()
+            self.keyboard.enable()
+        elif self.data.length() > 0:
+            if mode == "r":
+                self.data.restart_current()
+                self.keyboard.enable()
+            elif mode == "c":
+                playlist_name = input("Playlist name: ")
+                self.music_lib.create_playlist(playlist_name, self.data.get_song_names())
+            else:
+                self.data.end()
+        else:
+            self.data.end()
+
     def run(self):
         try:
+            self.start_workers()
             if self.data.has_songs():
-                self.start_keyboard()
+                self.keyboard.enable()
             while self.data.running():
-                if self.data.is_query_mode():
-                    query = input("Search: \n")
-                    success = self.music_lib.download_and_play_song(query, True, True)
-                    if success:
-                        if self.is_playing():
-                            self.stop()
-                        self.data.normal_mode()
-                        self.restart_keyboard()
-                    else:
-                        return_mode = "return to player" if self.data.has_songs() else "exit"
-                        ret = input(f"No song found, {return_mode} Y/N: ")
-                        if ret == "Y":
-                            if return_mode == "return to player":
-                                self.data.normal_mode()
-                                self.restart_keyboard()
-                                self.restart_ui()
-                            else:
-                                self.data.end()
-                elif self.is_playing():
-                    time.sleep(1e-3)
-                    continue
-                if self.data.has_songs() and self.data.inc_current():
+                if self.playing:
+                    # blocks until the player or the keyboard has something for the main thread
+                    self.handle(self.events.get())
+                elif self.data.is_query_mode():
+                    # nothing plays, query is shown on its own until a song is chosen
+                    self.ui.show_list()
+                    self.handle(self.events.get())
+                elif self.data.has_songs() and self.data.inc_current():
                     index, song = self.data.current()
                     self.data.set_selected(index)
                     self.play_audio(song)
                 else:
-                    self.wait_ui()
-                    self.wait_keyboard()
-                    self.data.reset_current()
-                    mode = input(self.get_no_songs_prompt())
-                    if mode == "p":
-                        self.music_lib.play_all()
-                        self.start_keyboard()
-                    elif mode == "q":
-                        self.data.query_mode()
-                    elif self.data.length() > 0:
-                        if mode == "r":
-                            self.data.restart_current()
-                            self.start_keyboard()
-                        elif mode == "c":
-                            playlist_name = input("Playlist name: ")
-                            self.music_lib.create_playlist(playlist_name, self.data.get_song_names())
-                        else:
-                            self.data.end()
-                            break
-                    else:
-                        self.data.end()
-                        break
+                    self.no_songs()
         except BaseException:
             self.stop()
             self.data.end()
             traceback.print_exc()
         finally:
-            self.wait_player()
-            self.wait_ui()
+            self.prefetcher.shutdown()
+            self.stop_workers()
             print(self.terminal.clear)
             print(self.terminal.home)
             print(self.terminal.normal_cursor)
-            self.wait_keyboard()
-            print(self.terminal.normal_cursor)
             print("Exiting...")
 
     # keyboard actions ---------------------------------------------
@@ -192,13 +336,19 @@ class App:
         self.data.set_current(self.data.get_selected() - 1)
 
     def action_query_mode(self):
-        self.ui.terminate()
-        self.ui_thread.join()
-        self.ui.clear()
-        self.data.query_mode()
+        self.start_query()
+
+    def action_shuffle(self):
+        self.data.shuffle()
+        self.post(self.QUEUE_CHANGED)
+
+    def action_dedupe(self):
+        self.data.dedupe()
+        self.post(self.QUEUE_CHANGED)
 
     def action_exit(self):
         self.stop()
         self.data.end()
+        self.post(self.EXIT)
 
     # ----------------------------------------------------------------
@@ -1,4 +1,8 @@
+import os
+import random
+from array import array
 from enum import Enum
+from itertools import count
 from threading import Lock
 from typing import List
 
@@ -11,37 +15,203 @@ class Mode(Enum):
     QUERY = 2
 
 
+class Query:
+    """
+    Text typed in query mode and library titles matching it, never changes once created
+    """
+
+    def __init__(self, text="", results=(), selected=0):
+        self.text = text
+        self.results = results
+        self.selected = selected
+
+    def chosen(self):
+        return self.results[self.selected] if self.results else None
+
+
+class Tracks:
+    """
+    Append only table of queued tracks, a track id stays valid for as long as the table lives.
+    Folders are stored once and shared by their tracks, a track only keeps its filename and the id of its folder.
+    Tracks aren't looked up by path, a song queued again gets a new track, so distinct songs cost no more than a
+    list of their paths would.
+    """
+
+    def __init__(self):
+        self._folder_ids = {}  # folder -> folder id
+        self._folders = []  # folder id -> folder, with its trailing separator
+        self._track_folders = array("I")  # track id -> folder id
+        self._filenames = []  # track id -> filename
+
+    def add(self, path):
+        split = path.rfind(os.sep) + 1
+        folder = path[:split]
+        folder_id = self._folder_ids.get(folder)
+        if folder_id is None:
+            folder_id = self._folder_ids[folder] = len(self._folders)
+            self._folders.append(folder)
+        self._track_folders.append(folder_id)
+        self._filenames.append(path[split:])
+        return len(self._filenames) - 1
+
+    def path(self, track_id):
+        return self._folders[self._track_folders[track_id]] + self._filenames[track_id]
+
+    def key(self, track_id):
+        """
+        Same for tracks of the same path
+        """
+        return self._track_folders[track_id], self._filenames[track_id]
+
+    def name(self, track_id):
+        return name_from_filename(self._filenames[track_id])
+
+
+class Snapshot:
+    """
+    Queue, current and selected song as they were at one version of Data, never changes once created.
+    query is None unless Data is in query mode.
+    """
+
+    def __init__(self, version, current, selected, queue, tracks, query=None):
+        self.version = version
+        self.current = current
+        self.selected = selected
+        self.queue = queue  # copy of the track ids
+        self.tracks = tracks  # track table only grows, ids in the copy stay valid
+        self.query = query
+
+    def length(self):
+        return len(self.queue)
+
+    def path_at(self, index):
+        return self.tracks.path(self.queue[index])
+
+
 class Data:
+    """
+    Play queue and player state shared by all threads.
+    Queue holds 4 byte track ids into the track table, see Tracks.
+    Every change gets a new version, snapshot returns a consistent view of the latest version without locking
+    unless something changed since it was last taken.
+    """
 
     def __init__(self):
         self._current = -1
         self._selected = 0
-        self._song_history = []
+        self._song_history = array("I")  # track ids
+        self._tracks = Tracks()
         self._running = True
         self._mode = Mode.NORMAL
+        self._query = None  # query typed in query mode, changes under selected_lock
         self.selected_lock = Lock()
         self.current_lock = Lock()
+        self._versions = count(1)
+        self._version = 0
+        self._queue_version = 0  # version of the last change to the queue itself
+        self._snapshot = Snapshot(0, self._current, self._selected, self._song_history[:], self._tracks)
+
+    def _changed(self, queue=False):
+        # next on count is atomic, changes made under different locks still get distinct versions
+        version = next(self._versions)
+        if queue:
+            self._queue_version = version
+        self._version = version
+
+    def version(self):
+        return self._version
+
+    def snapshot(self) -> Snapshot:
+        snapshot = self._snapshot
+        if snapshot.version == self._version:
+            return snapshot
+        # queue only changes under current_lock and selected only under selected_lock
+        self.current_lock.acquire()
+        self.selected_lock.acquire()
+        version = self._version
+        if self._queue_version <= snapshot.version:
+            queue = snapshot.queue
+        else:
+            queue = self._song_history[:]
+        snapshot = self._snapshot = Snapshot(version, self._current, self._selected, queue, self._tracks, self._query)
+        self.selected_lock.release()
+        self.current_lock.release()
+        return snapshot
 
     def insert_song_after_current(self, song):
         self.current_lock.acquire()
-        self._song_history.insert(self._current + 1, song)
+        # moves 4 bytes per following song
+        self._song_history.insert(self._current + 1, self._tracks.add(song))
+        self._changed(queue=True)
         self.current_lock.release()
 
     def restart_current(self):
         self.current_lock.acquire()
         self._current = -1
+        self._changed()
         self.current_lock.release()
 
     def reset_current(self):
         self.current_lock.acquire()
         self._current = self.length() - 1
+        self._changed()
         self.current_lock.release()
 
     def length(self):
         return len(self._song_history)
 
     def add_song(self, song):
-        self._song_history.append(song)
+        self.current_lock.acquire()
+        self._song_history.append(self._tracks.add(song))
+        self._changed(queue=True)
+        self.current_lock.release()
+
+    def shuffle(self):
+        """
+        Shuffles songs after the current one in place
+        """
+        self.current_lock.acquire()
+        start = self._current + 1
+        history = self._song_history
+        for i in range(len(history) - 1, start, -1):
+            j = random.randint(start, i)
+            history[i], history[j] = history[j], history[i]
+        self._changed(queue=True)
+        self.current_lock.release()
+
+    def dedupe(self):
+        """
+        Removes repeated songs in place, every song is kept once and the current song stays current
+        """
+        self.current_lock.acquire()
+        self.selected_lock.acquire()
+        history = self._song_history
+        key = self._tracks.key
+        seen = set()
+        if 0 <= self._current < len(history):
+            seen.add(key(history[self._current]))
+        kept = 0
+        current = self._current
+        selected = self._selected
+        for i, track_id in enumerate(history):
+            if i != self._current:
+                if key(track_id) in seen:
+                    continue
+                seen.add(key(track_id))
+            history[kept] = track_id
+            if i == self._current:
+                current = kept
+            if i == self._selected:
+                selected = kept
+            kept += 1
+        if self._current >= len(history):
+            current = kept
+        del history[kept:]
+        self._current = current
+        self._selected = min(selected, max(kept - 1, 0))
+        self._changed(queue=True)
+        self.selected_lock.release()
+        self.current_lock.release()
 
     def get_current(self):
         return self._current
@@ -62,12 +232,14 @@ class Data:
             self.current_lock.release()
             return False
         self._current += 1
+        self._changed()
         self.current_lock.release()
         return self._current < self.length()
 
     def set_current(self, index):
         self.current_lock.acquire()
         self._current = index
+        self._changed()
         self.current_lock.release()
 
     def inc_selected(self, inc=1):
@@ -75,34 +247,80 @@ class Data:
         new_selected = self._selected + inc
         if -1 < new_selected < len(self._song_history):
             self._selected = new_selected
+            self._changed()
         self.selected_lock.release()
 
     def set_selected(self, selected):
         self.selected_lock.acquire()
         if -1 < self._selected < len(self._song_history):
             self._selected = selected
+            self._changed()
         self.selected_lock.release()
 
     def get_selected(self):
         return self._selected
 
     def get_song(self, index):
-        return Song(self._song_history[index])
+        return Song(self.path_at(index))
 
     def previous(self):
-        return self._current - 1, Song(self._song_history[self._current - 1])
+        return self._current - 1, self.get_song(self._current - 1)
 
     def current(self):
-        return self._current, Song(self._song_history[self._current])
+        return self._current, self.get_song(self._current)
 
     def path_at(self, index):
-        return self._song_history[index]
+        return self._tracks.path(self._song_history[index])
+
+    def name_at(self, index):
+        return self._tracks.name(self._song_history[index])
 
     def query_mode(self):
+        self.selected_lock.acquire()
         self._mode = Mode.QUERY
+        self._query = Query()
+        self._changed()
+        self.selected_lock.release()
 
     def normal_mode(self):
+        self.selected_lock.acquire()
         self._mode = Mode.NORMAL
+        self._query = None
+        self._changed()
+        self.selected_lock.release()
+
+    def get_query(self) -> Query:
+        return self._query
+
+    def set_query_text(self, text):
+        """
+        Changes the typed text, results of the previous text are kept until results of this one are set
+        """
+        self.selected_lock.acquire()
+        if self._query is not None:
+            self._query = Query(text, self._query.results, self._query.selected)
+            self._changed()
+        self.selected_lock.release()
+
+    def set_query_results(self, text, results):
+        """
+        Sets results found for text, returns False and drops them if the typed text changed in the meantime
+        """
+        self.selected_lock.acquire()
+        current = self._query is not None and self._query.text == text
+        if current:
+            self._query = Query(text, tuple(results))
+            self._changed()
+        self.selected_lock.release()
+        return current
+
+    def inc_query_selected(self, inc=1):
+        self.selected_lock.acquire()
+        query = self._query
+        if query is not None and -1 < query.selected + inc < len(query.results):
+            self._query = Query(query.text, query.results, query.selected + inc)
+            self._changed()
+        self.selected_lock.release()
 
     def is_query_mode(self):
         return self._mode == Mode.QUERY
@@ -114,7 +332,8 @@ class Data:
         self._running = False
 
     def get_song_names(self) -> List[str]:
-        return list(map(name_from_filename, self._song_history))
+        name = self._tracks.name
+        return [name(track_id) for track_id in self._song_history]
 
 
 APP_DATA = Data()
@@ -0,0 +1,63 @@
+import time
+from queue import Empty
+
+from pygame import mixer
+
+
+class MixerClock:
+    """
+    Clock frames are rendered by: playback position of the song playing in the mixer and wall time between frames
+    """
+
+    @staticmethod
+    def position():
+        """
+        Playback position in milliseconds
+        """
+        return max(mixer.music.get_pos(), 0)
+
+    @staticmethod
+    def time():
+        return time.time()
+
+    @staticmethod
+    def wait(commands, timeout):
+        """
+        Waits up to timeout seconds for a command, raises Empty if none came in
+        """
+        return commands.get(timeout=timeout)
+
+    def frame_drawn(self):
+        pass
+
+
+class SimulatedClock:
+    """
+    Clock that only moves when the renderer waits, so rendering runs as fast as it can and gives the same frames every
+    run. Playback starts at time 0 and never pauses. Drawing a frame takes draw_cost seconds, which the renderer sees
+    when it measures how long drawing took, so frame drops and the lowered frame rate can be simulated.
+    Time is kept in nanoseconds, frame indexes don't drift through rounding.
+    """
+
+    def __init__(self, draw_cost=0.0):
+        self.now = 0
+        self.draw_cost = round(draw_cost * 1e9)
+
+    def advance(self, seconds):
+        self.now += max(round(seconds * 1e9), 0)
+
+    def position(self):
+        return self.now / 1e6
+
+    def time(self):
+        return self.now / 1e9
+
+    def wait(self, commands, timeout):
+        try:
+            return commands.get_nowait()
+        except Empty:
+            self.advance(timeout)
+            raise
+
+    def frame_drawn(self):
+        self.now += self.draw_cost
@@ -1,10 +1,16 @@
-import traceback
+import contextlib
+import itertools
+import sys
 
 from term_music.domain.playlist import Playlist
 from term_music.app_data import APP_DATA
-from term_music.app import App
 from term_music.config import Config
 from term_music.domain.music_library import MusicLibrary
+from term_music.extractor import YoutubeExtractor
+from term_music.library_index import LibraryIndex
+from term_music.load_journal import LoadJournal
+from term_music.load_pipeline import LoadPipeline
+from term_music.lookup_cache import LookupCache
 
 
 def generalized_search(search_func, query):
@@ -12,11 +18,35 @@ def generalized_search(search_func, query):
         print(x)
 
 
+def read_queries(path):
+    """
+    Yields non-empty lines of the file at path, of standard input if path is -
+    """
+    with (open(path) if path != "-" else contextlib.nullcontext(sys.stdin)) as lines:
+        for line in lines:
+            if line.strip():
+                yield line.strip()
+
+
 class Commands:
 
     def __init__(self, config: Config):
-        self.lib = MusicLibrary(APP_DATA, config.download_folder)
-        self.app = App(APP_DATA, self.lib, config)
+        self.config = config
+        lookups = LookupCache(config.lookup_cache_path, config.cache_settings["lookup_ttl_days"] * 24 * 60 * 60)
+        self.lib = MusicLibrary(APP_DATA, config.download_folder,
+                                LibraryIndex(config.index_path, config.download_folder), lookups=lookups)
+        self._app = None
+
+    @property
+    def app(self):
+        """
+        Player app, built the first time a command plays songs: it imports pygame and blessed and opens the audio
+        device, commands that only list or load songs work without a sound card
+        """
+        if self._app is None:
+            from term_music.app import App
+            self._app = App(APP_DATA, self.lib, self.config)
+        return self._app
 
     def run_command(self, command, args):
         if command is None:
@@ -62,6 +92,10 @@ class Commands:
             [print(p) for p in self.lib.playlists()]
         elif args.full:
             self.lib.print_songs_and_playlists()
+        elif args.contains:
+            [print(p) for p in self.lib.playlists_containing(args.contains)]
+        elif args.orphans:
+            [print(s) for s in self.lib.orphans()]
         elif args.playlist:
             [print(p) for p in self.lib.get_all_playlists()]
         else:
@@ -69,13 +103,21 @@ class Commands:
 
     def load(self, args):
         new_playlist = self.lib.get_or_create_playlist(Playlist.filename(args.playlist)) if args.playlist else None
-        for i, s in enumerate(args.songs):
-            try:
-                song_title = self.lib.search_and_download(s, args.check)
-                if new_playlist:
+        journal = LoadJournal(self.config.load_journal_path)
+        pipeline = LoadPipeline(self.lib.index, YoutubeExtractor(self.lib.download_folder, quiet=True),
+                                journal=journal, lookups=self.lib.lookups, **self.config.load_settings)
+        try:
+            queries = args.songs
+            total = len(args.songs)
+            if args.file:
+                queries = itertools.chain(queries, read_queries(args.file))
+                total = None
+            # songs are added in the order they were given, whichever finished first
+            for song_title in pipeline.load(queries, args.check, total):
+                if song_title and new_playlist:
                     new_playlist.add_song(song_title)
-            except Exception:
-                traceback.print_exc()
-            print(f"Processed {i + 1}/{len(args.songs)}")
+        finally:
+            pipeline.shutdown()
+            journal.close()
         if new_playlist:
             new_playlist.save()
@@ -7,6 +7,28 @@ UI_SETTINGS = {
     'width': 30,
     'height': 15,
     'print_char': '#',
+    'mode': 'wave',
+    'analysis_rate': 11025,
+}
+
+CACHE_SETTINGS = {
+    'frame_cache_mb': 256,
+    'frames_memory_mb': 64,
+    'prefetch_depth': 2,
+    'prefetch_memory_mb': 32,
+    'prefetch_workers': 2,
+    'lookup_ttl_days': 30,
+}
+
+LOAD_SETTINGS = {
+    'download_workers': 4,
+    'convert_workers': 0,
+    'retries': 2,
+}
+
+PLAYER_SETTINGS = {
+    'gapless': 'yes',
+    'crossfade_ms': 0,
 }
 
 KEYMAP = {
@@ -18,6 +40,8 @@ KEYMAP = {
     "KEY_ESCAPE": "action_exit",
     " ": "action_pause",
     "q": "action_query_mode",
+    "s": "action_shuffle",
+    "d": "action_dedupe",
 }
 
 
@@ -32,6 +56,9 @@ class Config:
             print(f"Creating app directory at {app_dir}")
             self.config["general"] = {"download_folder": os.path.join(app_dir, "music-lib")}
             self.config["ui"] = UI_SETTINGS
+            self.config["cache"] = CACHE_SETTINGS
+            self.config["player"] = PLAYER_SETTINGS
+            self.config["load"] = LOAD_SETTINGS
             self.config["keymap"] = {v: k for k, v in KEYMAP.items()}
             if not os.path.exists(app_dir):
                 os.makedirs(app_dir)
@@ -44,11 +71,48 @@ class Config:
 
     @property
     def ui_settings(self):
-        if "ui" in self.config["ui"]:
-            return {k: int(v) if v.isnumeric() else v for k, v in self.config["ui"].items()}
-        else:
-            return UI_SETTINGS
+        settings = dict(UI_SETTINGS)
+        if "ui" in self.config:
+            settings.update({k: int(v) if v.isnumeric() else v for k, v in self.config["ui"].items()})
+        return settings
 
     @property
     def download_folder(self):
         return self.config.get("general", "download_folder", fallback=os.path.join(self.app_dir, "music-lib"))
+
+    @property
+    def index_path(self):
+        return os.path.join(self.app_dir, "library.db")
+
+    @property
+    def load_journal_path(self):
+        return os.path.join(self.app_dir, "load.db")
+
+    @property
+    def lookup_cache_path(self):
+        return os.path.join(self.app_dir, "lookups.db")
+
+    @property
+    def cache_dir(self):
+        return os.path.join(self.app_dir, "cache")
+
+    @property
+    def cache_settings(self):
+        settings = dict(CACHE_SETTINGS)
+        if "cache" in self.config:
+            settings.update({k: int(v) if v.isnumeric() else v for k, v in self.config["cache"].items()})
+        return settings
+
+    @property
+    def player_settings(self):
+        return {
+            "gapless": self.config.getboolean("player", "gapless", fallback=PLAYER_SETTINGS["gapless"] == "yes"),
+            "crossfade": self.config.getint("player", "crossfade_ms", fallback=PLAYER_SETTINGS["crossfade_ms"]),
+        }
+
+    @property
+    def load_settings(self):
+        settings = dict(LOAD_SETTINGS)
+        if "load" in self.config:
+            settings.update({k: int(v) for k, v in self.config["load"].items() if k in LOAD_SETTINGS})
+        return settings
@@ -0,0 +1,22 @@
+import os
+import sqlite3
+
+
+def open_db(db_path, version, tables):
+    """
+    Connects to the SQLite database at db_path, the connection can be used by any thread holding the caller's lock.
+    tables maps every table to the statements creating it and its indexes. version is bumped whenever the schema
+    changes, tables of a database made for another version are dropped and created again.
+    """
+    if db_path != ":memory:":
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    db = sqlite3.connect(db_path, check_same_thread=False)
+    with db:
+        if db.execute("PRAGMA user_version").fetchone()[0] != version:
+            for table in tables:
+                db.execute(f"DROP TABLE IF EXISTS {table}")
+            db.execute(f"PRAGMA user_version = {version}")
+        for statements in tables.values():
+            for statement in statements:
+                db.execute(statement)
+    return db
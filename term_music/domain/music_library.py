@@ -1,68 +1,92 @@
 import os
 from typing import List
 
-import youtube_dl
-
 from term_music.app_data import Data
 from term_music.domain.playlist import Playlist
-from term_music.util import is_song, is_playlist, remove_extension, search
+from term_music.extractor import YoutubeExtractor
+from term_music.library_index import LibraryIndex, SONG, PLAYLIST
+from term_music.lookup_cache import LookupCache
+from term_music.util import is_playlist
 
 
 class MusicLibrary:
-    def __init__(self, data: Data, download_folder: str):
+    def __init__(self, data: Data, download_folder: str, index: LibraryIndex = None, extractor=None,
+                 lookups: LookupCache = None):
         self.download_folder = download_folder
         self.data = data
         if not os.path.exists(download_folder):
             os.mkdir(download_folder)
+        # songs and playlists are listed from the index, an in-memory one is scanned once per run
+        self.index = index or LibraryIndex(":memory:", download_folder)
+        self.search_indexes = {}  # kind -> (index generation, search index)
+        self.extractor = extractor or YoutubeExtractor(download_folder)
+        # youtube searches and downloaded videos, an in-memory cache only lasts for the run
+        self.lookups = lookups or LookupCache(":memory:")
 
     def download_song(self, song_url: str):
-        ydl_opts = {
-            "outtmpl": os.path.join(self.download_folder, "%(title)s.%(ext)s"),
-            "format": "bestaudio/best",
-            "postprocessors": [{
-                "key": "FFmpegExtractAudio",
-                "preferredcodec": "mp3",
-                "preferredquality": "192",
-            }],
-        }
-        with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([song_url])
-
-    def search_song(self, search_query: str):
-        return search(search_query, self.songs())
+        """
+        Downloads the song at song_url into the library, returns its title
+        """
+        self.index.refresh()
+        title, path = self.extractor.download(song_url)
+        filename = title + ".mp3"
+        self.extractor.convert(path, filename, self.index.place)
+        return title
+
+    def search_index(self, kind):
+        """
+        Search index of song or playlist titles, built again only when the library changed
+        """
+        self.index.refresh()
+        generation, search_index = self.search_indexes.get(kind, (None, None))
+        if generation != self.index.generation:
+            # numpy is imported with the first search, other commands don't need it
+            from term_music.search_index import SearchIndex
+            generation = self.index.generation
+            search_index = SearchIndex(self.index.titles(kind))
+            self.search_indexes[kind] = (generation, search_index)
+        return search_index
+
+    def prepare_song_search(self):
+        """
+        Builds the song search index ahead of the first search
+        """
+        self.search_index(SONG).prepare()
+
+    def search_song(self, search_query: str, fuzzy=True, limit=None):
+        """
+        Song titles matching search_query, best match first. Without fuzzy only titles containing it are returned.
+        """
+        return self.search_index(SONG).search(search_query, limit, fuzzy)
 
     def search_playlists(self, search_query: str):
-        return search(search_query, self.playlists())
+        return self.search_index(PLAYLIST).search(search_query)
 
     def search_and_play_playlist(self, search_query: str):
         self.play_playlist(self.search_playlists(search_query)[0])
 
     def search_and_download(self, song_query: str, check=False, ask=False):
-        ydl_opts = {
-            "default_search": "ytsearch",
-            "max_downloads": 1,
-            "format": "bestaudio/best",
-            "noplaylist": True,
-        }
-        with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(song_query, download=False)
-            song_title = info["entries"][0]["title"]
-            if ask:
-                ans = input(f"Do you want to download {song_title} Y/N: ")
-                if ans == "N":
-                    return None
-            if check and song_title in self.songs():
-                # don't download if we already have one
-                print(f"Skipped download of {song_title}")
-                return song_title
-            song_url = info["entries"][0]["webpage_url"]
-            # Download the song
-            self.download_song(song_url)
+        video_id, song_title, song_url = self.lookups.search(self.extractor, song_query)
+        local_title = self.lookups.local_title(self.index, video_id)
+        if local_title:
+            # video was downloaded before, maybe found by another query
+            return local_title
+        if ask:
+            ans = input(f"Do you want to download {song_title} Y/N: ")
+            if ans == "N":
+                return None
+        if check and self.index.contains(song_title + ".mp3"):
+            # don't download if we already have one
+            print(f"Skipped download of {song_title}")
             return song_title
+        # Download the song, title of the file can differ from the video title
+        song_title = self.download_song(song_url)
+        self.lookups.put_file(video_id, song_title + ".mp3")
+        return song_title
 
     def download_and_play_song(self, song_query: str, now=False, ask=False):
-        # Search the local music library for the song
-        search_result = self.search_song(song_query)
+        # Search the local music library for the song, a song that is only similar is downloaded instead
+        search_result = self.search_song(song_query, fuzzy=False)
         if search_result:
             # Found the song in the local library
             song_title = search_result[0]
@@ -99,66 +123,68 @@ class MusicLibrary:
             self.play_filename(filename)
 
     def play_playlist_filename(self, playlist_filename: str):
-        for song_title in Playlist.load(self.download_folder, playlist_filename).song_titles:
+        for song_title in self.load_playlist(playlist_filename).song_titles:
             self.play_song(song_title)
 
+    def load_playlist(self, playlist_filename: str):
+        return Playlist.load(self.download_folder, playlist_filename, self.index)
+
     def get_all_playlists(self):
-        playlists = []
-        for filename in os.listdir(self.download_folder):
-            if is_playlist(filename):
-                playlists.append(Playlist.load(self.download_folder, filename))
-        return playlists
+        return [self.load_playlist(filename) for filename in self.playlist_files()]
 
     def play_all(self):
-        for filename in os.listdir(self.download_folder):
-            # Play the file if it is an audio file
-            if is_song(filename):
-                self.play_filename(os.path.join(self.download_folder, filename))
+        for filename in self.song_files():
+            self.play_filename(filename)
 
     def play_all_playlists(self):
-        for filename in os.listdir(self.download_folder):
-            # Play the playlist if it is a text file
-            if is_playlist(filename):
-                self.play_playlist_filename(filename)
+        for filename in self.playlist_files():
+            self.play_playlist_filename(filename)
 
     def delete_song(self, song_title: str):
         # Delete the file with the given name from the download folder
         song_filename = f"{song_title}.mp3"
+        self.index.refresh()
+        before = self.index.state()
         os.remove(os.path.join(self.download_folder, song_filename))
+        self.index.remove(song_filename, before)
 
     def song_files(self):
-        return filter(is_song, os.listdir(self.download_folder))
+        return self.index.filenames(SONG)
 
     def playlist_files(self):
-        return filter(is_playlist, os.listdir(self.download_folder))
+        return self.index.filenames(PLAYLIST)
 
     def get_or_create_playlist(self, playlist_name: str):
         playlist_filename = Playlist.filename(playlist_name)
-        if playlist_filename in self.playlists():
-            return Playlist.load(self.download_folder, playlist_filename)
+        if self.index.contains(playlist_filename):
+            return self.load_playlist(playlist_filename)
         else:
-            return Playlist(self.download_folder, playlist_filename).save()
+            return Playlist(self.download_folder, playlist_filename, index=self.index).save()
 
     def create_playlist(self, playlist_name: str, song_titles: List[str]):
-        return Playlist(self.download_folder, Playlist.filename(playlist_name), song_titles).save()
+        return Playlist(self.download_folder, Playlist.filename(playlist_name), song_titles, self.index).save()
 
     def songs(self):
-        return set(remove_extension(self.song_files()))
+        return set(self.index.titles(SONG))
 
     def playlists(self):
-        return set(remove_extension(self.playlist_files()))
+        return set(self.index.titles(PLAYLIST))
+
+    def playlists_containing(self, song_title: str):
+        return self.index.playlists_containing(song_title)
+
+    def orphans(self):
+        """
+        Songs that aren't on any playlist
+        """
+        return self.index.orphans()
 
     def print_songs_and_playlists(self):
-        # Create a dictionary to map each song to the playlists it belongs to
-        song_playlists = {}
-        playlists = self.get_all_playlists()
-        for song in self.songs():
-            for playlist in playlists:
-                if song in playlist.song_titles:
-                    song_playlists.setdefault(song, []).append(playlist.playlist_name)
+        # songs are mapped to the playlists they belong to by the index, playlists are read once and kept indexed
+        song_playlists = self.index.song_playlists()
 
         # Print a table with each song and the playlists it belongs to
         print("{:15s}  {:s}".format("Song", "Playlists"))
         print("{:15s}  {:s}".format("----", "--------"))
-        for song in self.songs():
-            print("{:15s}  {:s}".format(song, ", ".join(song_playlists[song]) if song_playlists.get(song) else ""))
+        for song, playlists in song_playlists.items():
+            print("{:15s}  {:s}".format(song, ", ".join(playlists)))
@@ -7,14 +7,16 @@ class Playlist:
     Playlist is a text file saved in music lib folder.
     Each line of the file is a song title.
     Songs are saved in files with the same name as song title and extension .mp3
+    Saved playlist is added to the library index, if there is one.
     """
 
-    def __init__(self, download_folder, playlist_name, songs=None):
+    def __init__(self, download_folder, playlist_name, songs=None, index=None):
         if songs is None:
             songs = []
         self.download_folder = download_folder
         self.playlist_name = playlist_name
         self.song_titles = songs
+        self.index = index
 
     def add_song(self, song_title):
         # Add the given song title to the playlist
@@ -26,19 +28,25 @@ class Playlist:
 
     def save(self):
         # Save the playlist to a file with the given name in the download folder
+        before = None
+        if self.index:
+            self.index.refresh()
+            before = self.index.state()
         playlist_file = open(os.path.join(self.download_folder, self.playlist_name), "w")
         for song_title in self.song_titles:
             playlist_file.write(song_title + "\n")
         playlist_file.close()
+        if self.index:
+            self.index.add(self.playlist_name, before)
         return self
 
     @staticmethod
-    def load(download_folder, playlist_name):
+    def load(download_folder, playlist_name, index=None):
         # Load the playlist from the given file in the download folder
         playlist_file = open(os.path.join(download_folder, playlist_name), "r")
         song_titles = playlist_file.readlines()
         playlist_file.close()
-        playlist = Playlist(download_folder, playlist_name)
+        playlist = Playlist(download_folder, playlist_name, index=index)
         playlist.song_titles = [title.strip() for title in song_titles]
         return playlist
 
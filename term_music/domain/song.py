@@ -1,9 +1,13 @@
 import os
+import subprocess
 
-from pydub import AudioSegment
+from term_music.profiler import PROFILER
 
 
 class Song:
+    # pcm data produced by stream defaults to the format pygame plays
+    SAMPLE_RATE = 44100
+    CHANNELS = 2
 
     def __init__(self, path, audio=None):
         self.path = path
@@ -15,5 +19,48 @@ class Song:
 
     def audio(self):
         if not self._audio:
-            self._audio = AudioSegment.from_mp3(self.path)
+            # pydub is only imported once audio is needed, listing and searching the library doesn't need it
+            from pydub import AudioSegment
+
+            with PROFILER.span("decode", "audio", path=self.path) as span:
+                self._audio = AudioSegment.from_mp3(self.path)
+                span.set(bytes=len(self._audio.raw_data))
         return self._audio
+
+    def duration(self):
+        if self._audio:
+            return self._audio.duration_seconds
+        from pydub.utils import mediainfo
+        return float(mediainfo(self.path).get("duration", 0))
+
+    def stream(self, start=0, sample_rate=SAMPLE_RATE, channels=CHANNELS):
+        """
+        Decodes the song from start seconds with ffmpeg and yields chunks of raw 16 bit pcm data as they are decoded,
+        ffmpeg resamples and downmixes to sample_rate and channels while decoding.
+        Decoding only runs as far ahead as the consumer of the chunks (and the pipe buffer) allows.
+        Already decoded audio is used instead if there is any.
+        """
+        audio = self._audio
+        if audio:
+            audio = audio.set_frame_rate(sample_rate).set_channels(channels).set_sample_width(2)
+            yield audio[int(start * 1000):].raw_data
+            return
+        from pydub import AudioSegment
+        # half a second of 16 bit samples, a whole number of samples so no chunk starts in the middle of one
+        chunk_size = (sample_rate // 2) * channels * 2
+        process = subprocess.Popen([AudioSegment.converter, "-loglevel", "error", "-ss", str(start), "-i", self.path,
+                                    "-vn", "-f", "s16le", "-acodec", "pcm_s16le",
+                                    "-ac", str(channels), "-ar", str(sample_rate), "-"],
+                                   stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            while True:
+                with PROFILER.span("decode stream", "audio") as span:
+                    chunk = process.stdout.read(chunk_size)
+                    span.set(bytes=len(chunk))
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            process.kill()
+            process.stdout.close()
+            process.wait()
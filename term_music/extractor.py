@@ -0,0 +1,79 @@
+import os
+import subprocess
+
+
+class YoutubeExtractor:
+    """
+    Finds songs on youtube and downloads their audio with youtube-dl.
+    Download and conversion to mp3 are separate steps, so they can run on separate workers. Any object with the same
+    methods can stand in for it, e.g. one serving files from a local server.
+    """
+    DOWNLOAD_SUFFIX = ".download"
+    PARTIAL_SUFFIX = ".part"
+    # downloads and songs being converted are kept in a subfolder, the library folder only changes once a song is
+    # complete, so the index takes the song in without scanning the folder
+    STAGING_FOLDER = ".downloading"
+
+    def __init__(self, folder, bitrate="192k", quiet=False):
+        self.folder = folder
+        self.staging = os.path.join(folder, self.STAGING_FOLDER)
+        self.bitrate = bitrate
+        self.quiet = quiet
+
+    def search(self, query):
+        """
+        Returns (video id, title, url) of the first video found for query
+        """
+        # youtube-dl takes a third of a second to import, commands that don't go to youtube shouldn't wait for it
+        import youtube_dl
+        ydl_opts = {
+            "default_search": "ytsearch",
+            "max_downloads": 1,
+            "format": "bestaudio/best",
+            "noplaylist": True,
+            "quiet": self.quiet,
+        }
+        with youtube_dl.YoutubeDL(ydl_opts) as ydl:
+            entry = ydl.extract_info(query, download=False)["entries"][0]
+            return entry["id"], entry["title"], entry["webpage_url"]
+
+    def download(self, url):
+        """
+        Downloads audio of the video at url, returns (title, path of the downloaded file)
+        """
+        import youtube_dl
+        os.makedirs(self.staging, exist_ok=True)
+        ydl_opts = {
+            # downloaded files don't end with .mp3, so they aren't taken for songs before they are converted
+            "outtmpl": os.path.join(self.staging, "%(title)s" + self.DOWNLOAD_SUFFIX + ".%(ext)s"),
+            "format": "bestaudio/best",
+            "quiet": self.quiet,
+        }
+        with youtube_dl.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(url)
+            path = ydl.prepare_filename(info)
+        title = os.path.basename(path)[:-len(self.DOWNLOAD_SUFFIX + "." + info["ext"])]
+        return title, path
+
+    def place(self, path, filename):
+        os.replace(path, os.path.join(self.folder, filename))
+
+    def convert(self, source, filename, place=None):
+        """
+        Converts the downloaded file to filename in the folder with ffmpeg and removes it.
+        The mp3 is written under a name that isn't taken for a song and moved into place once it is complete, by
+        place(path, filename) if given, e.g. LibraryIndex.place to add it to the index.
+        """
+        os.makedirs(self.staging, exist_ok=True)
+        partial = os.path.join(self.staging, filename + self.PARTIAL_SUFFIX)
+        try:
+            subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-i", source, "-vn", "-codec:a", "libmp3lame",
+                            "-b:a", self.bitrate, "-f", "mp3", partial],
+                           check=True, stdin=subprocess.DEVNULL, capture_output=True)
+            (place or self.place)(partial, filename)
+        except BaseException:
+            # conversion failed or was interrupted, e.g. by ctrl+c
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        os.remove(source)
@@ -0,0 +1,102 @@
+import hashlib
+import os
+
+import numpy as np
+
+
+class FrameCache:
+    """
+    On-disk cache of visualizer frames.
+    Each entry is a .npy file named after a hash of the song file identity (path, size, mtime) and the ui settings
+    used to compute the frames. Entries are read back as memory maps, least recently used entries are removed once
+    the cache grows over max_size bytes.
+    """
+
+    EXTENSION = ".npy"
+    # bumped whenever the layout of stored frames changes
+    VERSION = 2
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    @staticmethod
+    def key(path, *settings):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # not a file on disk (e.g. a sliced song), nothing to key on
+            return None
+        identity = [FrameCache.VERSION, os.path.abspath(path), stat.st_size, stat.st_mtime_ns, *settings]
+        return hashlib.sha1("|".join(map(str, identity)).encode()).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.cache_dir, key + self.EXTENSION)
+
+    def get(self, key):
+        if key is None:
+            return None
+        file = self._file(key)
+        try:
+            frames = np.load(file, mmap_mode="r")
+            # touch the entry so eviction sees it as recently used
+            os.utime(file)
+        except (OSError, ValueError):
+            return None
+        return frames
+
+    def put(self, key, frames):
+        if key is None or frames.nbytes > self.max_size:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        file = self._file(key)
+        tmp_file = f"{file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_file, "wb") as f:
+                np.save(f, frames)
+            os.replace(tmp_file, file)
+        except OSError:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            return
+        self.evict()
+
+    def entries(self):
+        """
+        Returns list of (mtime, size, path) tuples for every cache entry, least recently used first
+        """
+        entries = []
+        try:
+            filenames = os.listdir(self.cache_dir)
+        except OSError:
+            return entries
+        for filename in filenames:
+            if not filename.endswith(self.EXTENSION):
+                continue
+            path = os.path.join(self.cache_dir, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        entries.sort()
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
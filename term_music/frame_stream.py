@@ -0,0 +1,110 @@
+from threading import Lock
+
+import numpy as np
+
+from term_music.profiler import PROFILER
+
+
+class FrameStream:
+    """
+    Random access to frames produced by a stream of frame blocks.
+    source(start) returns the stream of frame blocks beginning at frame start, blocks are pulled from it only when a
+    frame past the ones already produced is requested. All produced frames are kept (a few hundred KB for a long song)
+    so frames can be read again from any position. A suspended stream releases its source and resumes from the last
+    produced frame when more frames are requested.
+    """
+
+    def __init__(self, source, width, dtype, on_complete=None):
+        self.source = source
+        self.blocks = None
+        self.frames = np.zeros((0, width), dtype=dtype)
+        self.length = 0
+        self.complete = False
+        self.closed = False
+        self.on_complete = on_complete
+        self.lock = Lock()
+
+    @staticmethod
+    def of(frames):
+        """
+        Stream over frames that were already computed
+        """
+        stream = FrameStream(None, frames.shape[1], frames.dtype)
+        stream.frames = frames
+        stream.length = len(frames)
+        stream.complete = True
+        return stream
+
+    def _pull(self):
+        if self.blocks is None:
+            self.blocks = iter(self.source(self.length))
+        # frames of the block are computed, and audio decoded for them, when it is pulled
+        with PROFILER.span("frames", "frames") as span:
+            block = next(self.blocks, None)
+            span.set(frames=len(block) if block is not None else 0)
+        if block is None:
+            self.blocks = None
+            self.complete = True
+            self.frames = self.frames[:self.length]
+            if self.on_complete:
+                self.on_complete(self.frames)
+            return
+        end = self.length + len(block)
+        if end > len(self.frames):
+            # grow by doubling so appending is amortized constant per frame
+            grown = np.zeros((max(end, 2 * len(self.frames)), self.frames.shape[1]), dtype=self.frames.dtype)
+            grown[:self.length] = self.frames[:self.length]
+            self.frames = grown
+        self.frames[self.length:end] = block
+        self.length = end
+
+    def get(self, index):
+        """
+        Returns frame at index, computing frames up to it if needed. Returns None if the song has less frames.
+        """
+        with self.lock:
+            while index >= self.length and not self.complete and not self.closed:
+                self._pull()
+            if index >= self.length:
+                return None
+            return self.frames[index]
+
+    def fill(self):
+        """
+        Computes all remaining frames, stops early if the stream is closed.
+        The lock is taken for one block at a time, so frames can be read while the stream is filled.
+        """
+        while True:
+            with self.lock:
+                if self.complete or self.closed:
+                    return self
+                self._pull()
+
+    def done(self):
+        """
+        True when no more frames will be produced
+        """
+        return self.complete or self.closed
+
+    def nbytes(self):
+        return self.frames.nbytes
+
+    def _release(self):
+        if self.blocks is not None and hasattr(self.blocks, "close"):
+            self.blocks.close()
+        self.blocks = None
+
+    def suspend(self):
+        """
+        Stops the source, it is started again from the last produced frame if more frames are requested
+        """
+        with self.lock:
+            self._release()
+
+    def close(self):
+        """
+        Stops the source for good, frames produced so far can still be read
+        """
+        with self.lock:
+            self._release()
+            self.closed = True
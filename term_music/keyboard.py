@@ -1,10 +1,24 @@
+from threading import Event, current_thread
+
+
 class Keyboard:
+    """
+    Input worker, listen dispatches keys to keymap actions while the keyboard is enabled.
+    Terminal is released (cbreak mode is left) while the keyboard is disabled so other threads can read input.
+    While a handler is set all keys go to it instead of the keymap.
+    """
+    # longest time a disabled keyboard keeps the terminal
+    KEY_TIMEOUT = 0.1
 
     def __init__(self, data, terminal, keymap):
         self.terminal = terminal
         self.keymap = keymap
         self.data = data
-        self.is_blocking = False
+        self.enabled = Event()
+        self.released = Event()
+        self.released.set()
+        self.thread = None
+        self.handler = None
 
     def add_key(self, key, func):
         self.keymap[key] = func
@@ -12,14 +26,44 @@ class Keyboard:
     def remove_key(self, key):
         self.keymap.pop(key)
 
-    def listen(self):
-        with self.terminal.cbreak():
-            while self.data.has_songs() and not self.data.is_query_mode():
-                self.is_blocking = True
-                key = self.terminal.inkey()
-                self.is_blocking = False
-                if key.is_sequence:
-                    self.keymap.get(key.name, lambda: None)()
-                else:
-                    self.keymap.get(key, lambda: None)()
+    def set_handler(self, handler):
+        self.handler = handler
+
+    def enable(self):
+        self.enabled.set()
 
+    def disable(self):
+        """
+        Stops listening, unless called from the keyboard thread itself it returns once the terminal is released
+        """
+        self.enabled.clear()
+        if current_thread() is not self.thread:
+            self.released.wait()
+
+    def stop(self):
+        """
+        Makes listen return, should be called once the app stopped running
+        """
+        self.enabled.set()
+
+    def listen(self):
+        self.thread = current_thread()
+        while self.data.running():
+            self.enabled.wait()
+            if not self.data.running():
+                break
+            self.released.clear()
+            try:
+                with self.terminal.cbreak():
+                    while self.enabled.is_set() and self.data.running():
+                        key = self.terminal.inkey(timeout=self.KEY_TIMEOUT)
+                        if not key:
+                            continue
+                        if self.handler:
+                            self.handler(key)
+                        elif key.is_sequence:
+                            self.keymap.get(key.name, lambda: None)()
+                        else:
+                            self.keymap.get(key, lambda: None)()
+            finally:
+                self.released.set()
@@ -0,0 +1,223 @@
+import os
+from threading import Lock
+
+from term_music.db import open_db
+from term_music.profiler import PROFILER
+from term_music.util import is_song, is_playlist
+
+SONG = "song"
+PLAYLIST = "playlist"
+
+
+class LibraryIndex:
+    """
+    SQLite index of song and playlist files in the music library folder.
+    Listings and searches are served from the index instead of listing the folder. Files added or removed by the app
+    update the index right away, the folder is scanned again only when its mtime differs from the one stored with
+    the last scan (files added or removed outside the app).
+    Songs on each playlist are indexed too, a playlist is read again only when its file was written since it was
+    last read.
+    """
+
+    VERSION = 2
+    TABLES = {
+        # stamp is the size and mtime of a playlist file when its songs were indexed, NULL until they are
+        "files": ["CREATE TABLE IF NOT EXISTS files (filename TEXT PRIMARY KEY, kind TEXT NOT NULL, "
+                  "title TEXT NOT NULL, folded TEXT NOT NULL, stamp TEXT)",
+                  "CREATE INDEX IF NOT EXISTS files_kind ON files (kind, title)"],
+        "playlist_songs": ["CREATE TABLE IF NOT EXISTS playlist_songs (playlist TEXT NOT NULL, title TEXT NOT NULL, "
+                           "PRIMARY KEY (playlist, title)) WITHOUT ROWID",
+                           "CREATE INDEX IF NOT EXISTS playlist_songs_title ON playlist_songs (title, playlist)"],
+        "meta": ["CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"],
+    }
+
+    def __init__(self, db_path, folder):
+        self.folder = folder
+        self.lock = Lock()
+        self.generation = 0  # bumped whenever indexed files change, derived data is rebuilt when it moves
+        self.db = open_db(db_path, self.VERSION, self.TABLES)
+
+    @staticmethod
+    def kind(filename):
+        if is_song(filename):
+            return SONG
+        if is_playlist(filename):
+            return PLAYLIST
+        return None
+
+    @staticmethod
+    def _row(filename, kind):
+        title = filename[:-4]
+        return filename, kind, title, title.lower(), None
+
+    def _folder_state(self):
+        try:
+            return f"{os.path.abspath(self.folder)}|{os.stat(self.folder).st_mtime_ns}"
+        except OSError:
+            return None
+
+    def _stored_state(self):
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'folder'").fetchone()
+        return row[0] if row else None
+
+    def _store_state(self, state):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('folder', ?)", (state,))
+
+    def _update(self, added, removed, state):
+        if added or removed:
+            self.generation += 1
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                                [self._row(filename, self.kind(filename)) for filename in added])
+            self.db.executemany("DELETE FROM files WHERE filename = ?", [(filename,) for filename in removed])
+            self.db.executemany("DELETE FROM playlist_songs WHERE playlist = ?", [(filename,) for filename in removed])
+            if state is not None:
+                self._store_state(state)
+
+    def _scan(self, state):
+        with PROFILER.span("library scan", "library") as span:
+            found = {filename for filename in os.listdir(self.folder) if self.kind(filename)}
+            known = {row[0] for row in self.db.execute("SELECT filename FROM files")}
+            # only the difference is written
+            self._update(found - known, known - found, state)
+            span.set(files=len(found), added=len(found - known), removed=len(known - found))
+
+    def refresh(self, force=False):
+        """
+        Scans the folder again if it changed since the last scan, costs a single stat otherwise
+        """
+        with self.lock:
+            state = self._folder_state()
+            if state is None:
+                return
+            if force or state != self._stored_state():
+                self._scan(state)
+
+    def state(self):
+        """
+        State of the folder, taken right before writing or deleting files to pass to update
+        """
+        return self._folder_state()
+
+    def _apply(self, added, removed, before):
+        # the folder only changed by these files if it was as stored right before they changed, otherwise the state
+        # is left stale so the next refresh scans the folder for the other changes
+        stored = self._stored_state()
+        state = self._folder_state() if before is not None and before == stored else None
+        self._update(added, removed, state)
+
+    def update(self, added, removed, before=None):
+        """
+        Applies files added to and removed from the folder since the index was last refreshed.
+        before is the state of the folder taken right before the files changed, without it the next refresh scans
+        the folder.
+        """
+        added = [filename for filename in added if self.kind(filename)]
+        with self.lock:
+            self._apply(added, removed, before)
+
+    def add(self, filename, before=None):
+        """
+        Adds a file written to the folder, index should be refreshed before the file is written
+        """
+        self.update([filename], [], before)
+
+    def remove(self, filename, before=None):
+        """
+        Removes a file deleted from the folder, index should be refreshed before the file is deleted
+        """
+        self.update([], [filename], before)
+
+    def place(self, path, filename):
+        """
+        Moves the file at path into the folder as filename and adds it, path should be on the same file system
+        """
+        with self.lock:
+            before = self._folder_state()
+            os.replace(path, os.path.join(self.folder, filename))
+            self._apply([filename] if self.kind(filename) else [], [], before)
+
+    def _query(self, statement, parameters=()):
+        self.refresh()
+        with self.lock:
+            return [row[0] for row in self.db.execute(statement, parameters)]
+
+    def titles(self, kind):
+        return self._query("SELECT title FROM files WHERE kind = ? ORDER BY title", (kind,))
+
+    def filenames(self, kind):
+        return self._query("SELECT filename FROM files WHERE kind = ? ORDER BY title", (kind,))
+
+    def contains(self, filename):
+        return bool(self._query("SELECT 1 FROM files WHERE filename = ?", (filename,)))
+
+    def _stamp(self, filename):
+        try:
+            stat = os.stat(os.path.join(self.folder, filename))
+        except OSError:
+            return None
+        return f"{stat.st_size}|{stat.st_mtime_ns}"
+
+    def _read_playlist(self, filename):
+        try:
+            with open(os.path.join(self.folder, filename), "r") as playlist_file:
+                return {line.strip() for line in playlist_file if line.strip()}
+        except OSError:
+            return set()
+
+    def _index_playlists(self):
+        """
+        Reads playlists written since they were last read, costs a stat per playlist otherwise
+        """
+        rows = self.db.execute("SELECT filename, stamp FROM files WHERE kind = ?", (PLAYLIST,)).fetchall()
+        changed = []
+        for filename, stored in rows:
+            stamp = self._stamp(filename)
+            if stamp != stored:
+                changed.append((filename, stamp))
+        if not changed:
+            return
+        with PROFILER.span("playlist index", "library", playlists=len(changed)), self.db:
+            for filename, stamp in changed:
+                self.db.execute("DELETE FROM playlist_songs WHERE playlist = ?", (filename,))
+                self.db.executemany("INSERT INTO playlist_songs VALUES (?, ?)",
+                                    [(filename, title) for title in self._read_playlist(filename)])
+                self.db.execute("UPDATE files SET stamp = ? WHERE filename = ?", (stamp, filename))
+
+    def _playlist_query(self, statement, parameters=()):
+        self.refresh()
+        with self.lock:
+            self._index_playlists()
+            return self.db.execute(statement, parameters).fetchall()
+
+    def playlists_containing(self, title):
+        """
+        Filenames of playlists having the song title on them
+        """
+        return [row[0] for row in self._playlist_query(
+            "SELECT p.playlist FROM playlist_songs p JOIN files f ON f.filename = p.playlist "
+            "WHERE p.title = ? ORDER BY f.title", (title,))]
+
+    def song_playlists(self):
+        """
+        Title of every song mapped to filenames of playlists having it on them
+        """
+        song_playlists = {}
+        for title, playlist in self._playlist_query(
+                "SELECT s.title, p.playlist FROM files s LEFT JOIN playlist_songs p ON p.title = s.title "
+                "LEFT JOIN files f ON f.filename = p.playlist WHERE s.kind = ? ORDER BY s.title, f.title", (SONG,)):
+            playlists = song_playlists.setdefault(title, [])
+            if playlist is not None:
+                playlists.append(playlist)
+        return song_playlists
+
+    def orphans(self):
+        """
+        Titles of songs that aren't on any playlist
+        """
+        return [row[0] for row in self._playlist_query(
+            "SELECT title FROM files WHERE kind = ? AND title NOT IN (SELECT title FROM playlist_songs) "
+            "ORDER BY title", (SONG,))]
+
+    def close(self):
+        self.db.close()
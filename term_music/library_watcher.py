@@ -0,0 +1,125 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+from threading import Event
+
+from term_music.library_index import LibraryIndex
+
+logger = logging.getLogger(__name__)
+
+# inotify constants from linux/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, length of the name that follows
+
+
+class Inotify:
+    """
+    Minimal inotify binding watching a single directory, raises OSError where inotify isn't available
+    """
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM | IN_DELETE_SELF
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, folder):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            init, add_watch = libc.inotify_init1, libc.inotify_add_watch
+        except (OSError, AttributeError, TypeError):
+            raise OSError("inotify is not available")
+        self.fd = init(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if add_watch(self.fd, os.fsencode(folder), self.MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"watching {folder} failed")
+
+    def read(self, timeout):
+        """
+        Waits at most timeout seconds for events, returns list of (mask, name) tuples
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            buffer = os.read(self.fd, self.READ_SIZE)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(buffer):
+            _, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class LibraryWatcher:
+    """
+    Watcher worker, run keeps the library index up to date with files added to or removed from the folder by other
+    programs until stop is called. Changes are read from inotify where it is available and applied to the index one
+    by one, elsewhere the folder mtime is polled and the index refreshed when it changes.
+    """
+    # longest time a change waits to be applied
+    INTERVAL = 0.5
+
+    def __init__(self, index: LibraryIndex):
+        self.index = index
+        self.stopped = Event()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        try:
+            inotify = Inotify(self.index.folder)
+        except OSError:
+            logger.debug("Watching %s with inotify failed, polling it", self.index.folder, exc_info=True)
+            self.poll()
+            return
+        try:
+            # files changed before the watch was added are found by the refresh
+            self.index.refresh()
+            self.watch(inotify)
+        finally:
+            inotify.close()
+
+    def poll(self):
+        while not self.stopped.wait(self.INTERVAL):
+            self.index.refresh()
+
+    def watch(self, inotify: Inotify):
+        while not self.stopped.is_set():
+            # every change is seen while the watch is active, so the index moves on to the state after the events
+            # without scanning, unless the app changed the folder in the meantime
+            before = self.index.state()
+            added, removed = set(), set()
+            for mask, name in inotify.read(self.INTERVAL):
+                if mask & IN_Q_OVERFLOW:
+                    # events were dropped, only a scan can tell what changed
+                    self.index.refresh(force=True)
+                elif mask & (IN_DELETE_SELF | IN_IGNORED):
+                    # folder is gone, nothing left to watch
+                    return
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    added.add(name)
+                    removed.discard(name)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    removed.add(name)
+                    added.discard(name)
+            if added or removed:
+                self.index.update(added, removed, before)
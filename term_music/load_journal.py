@@ -0,0 +1,55 @@
+import time
+from threading import Lock
+
+from term_music.db import open_db
+
+SEARCHED = "searched"
+DOWNLOADED = "downloaded"
+CONVERTED = "converted"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+class LoadJournal:
+    """
+    SQLite journal of songs loaded from queries, the latest state of every query is kept.
+    A load that is run again picks every query up from where it got to: searched queries aren't searched again,
+    downloaded audio is converted without downloading it again and loaded songs are skipped. Failed queries start over.
+    """
+
+    VERSION = 2
+    TABLES = {
+        "queries": ["CREATE TABLE IF NOT EXISTS queries (query TEXT PRIMARY KEY, state TEXT NOT NULL, "
+                    "video_id TEXT, title TEXT, url TEXT, path TEXT, error TEXT, updated REAL NOT NULL)"],
+    }
+
+    def __init__(self, db_path):
+        self.lock = Lock()
+        self.db = open_db(db_path, self.VERSION, self.TABLES)
+        # every state change is committed, the journal only has to survive the app, not the os crashing
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+
+    def get(self, query):
+        """
+        Returns (state, video id, title, url, path) of query, None if it wasn't loaded before
+        """
+        with self.lock:
+            return self.db.execute("SELECT state, video_id, title, url, path FROM queries WHERE query = ?",
+                                   (query,)).fetchone()
+
+    def set(self, query, state, video_id=None, title=None, url=None, path=None, error=None):
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            (query, state, video_id, title, url, path, error, time.time()))
+
+    def failed(self):
+        """
+        (query, error) of queries that failed in the last load they were in
+        """
+        with self.lock:
+            return self.db.execute("SELECT query, error FROM queries WHERE state = ? ORDER BY updated",
+                                   (FAILED,)).fetchall()
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,235 @@
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+
+from term_music.library_index import LibraryIndex
+from term_music.load_journal import LoadJournal, SEARCHED, DOWNLOADED, CONVERTED, SKIPPED, FAILED
+from term_music.lookup_cache import LookupCache
+
+logger = logging.getLogger(__name__)
+
+
+class LoadProgress:
+    """
+    Counts of songs that went through each stage of the pipeline, written as a single line that is updated in place.
+    total is None when the number of songs isn't known up front.
+    """
+    # least seconds between two updates of the line
+    INTERVAL = 0.1
+
+    def __init__(self, total=None, stream=None):
+        self.total = total
+        self.stream = stream or sys.stdout
+        self.lock = Lock()
+        self.searched = 0
+        self.downloaded = 0
+        self.converted = 0
+        self.skipped = 0
+        self.failed = 0
+        self.retried = 0
+        self.written = 0
+
+    def count(self, stage):
+        with self.lock:
+            setattr(self, stage, getattr(self, stage) + 1)
+            if time.monotonic() - self.written >= self.INTERVAL:
+                self.write()
+
+    def fail(self, query, error):
+        with self.lock:
+            self.failed += 1
+            self.stream.write(f"\rLoading {query} failed: {error}\n")
+            self.write()
+
+    def done(self):
+        return self.converted + self.skipped + self.failed
+
+    def write(self):
+        total = f"/{self.total}" if self.total is not None else ""
+        self.stream.write(f"\rProcessed {self.done()}{total}: searched {self.searched}, "
+                          f"downloaded {self.downloaded}, converted {self.converted}, skipped {self.skipped}, "
+                          f"failed {self.failed}, retries {self.retried}")
+        self.stream.flush()
+        self.written = time.monotonic()
+
+    def finish(self):
+        with self.lock:
+            self.write()
+            self.stream.write("\n")
+
+
+class LoadPipeline:
+    """
+    Loads songs found for a list of queries into the library.
+    Every query is searched and its audio downloaded on a pool of download_workers threads, downloaded audio is
+    converted to mp3 on a separate pool of convert_workers threads (one per core by default) while other songs
+    download. Each stage is tried retries more times before the song fails. At most max_pending songs are in the
+    pipeline at once, so downloaded files don't pile up waiting for conversion.
+    The extractor searches, downloads and converts, see YoutubeExtractor.
+    With a journal the state of every song is recorded as it moves through the pipeline, a load that is run again
+    skips songs that were loaded and goes on from the last state of the others, see LoadJournal.
+    With lookups searches are answered from the cache when they can be and videos that were downloaded before, maybe
+    for another query, are skipped, see LookupCache.
+    """
+    # seconds to wait before the first retry, doubled for every one after it
+    RETRY_DELAY = 1
+
+    def __init__(self, index: LibraryIndex, extractor, download_workers=4, convert_workers=0, retries=2,
+                 max_pending=0, progress_stream=None, journal: LoadJournal = None, lookups: LookupCache = None):
+        self.index = index
+        self.extractor = extractor
+        self.journal = journal
+        self.lookups = lookups
+        self.retries = retries
+        self.downloaders = ThreadPoolExecutor(max_workers=max(download_workers, 1), thread_name_prefix="DOWNLOAD")
+        self.converters = ThreadPoolExecutor(max_workers=max(convert_workers or os.cpu_count() or 1, 1),
+                                             thread_name_prefix="CONVERT")
+        self.max_pending = max(max_pending or 2 * max(download_workers, 1), 1)
+        self.slots = BoundedSemaphore(self.max_pending)
+        self.progress_stream = progress_stream
+        self.progress = None
+        self.lock = Lock()
+        self.loading = {}  # title -> future of a song being loaded, a title found again while it loads is loaded once
+
+    def _retry(self, func, *args):
+        for attempt in range(self.retries + 1):
+            try:
+                return func(*args)
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                logger.debug("%s%s failed, retrying", func.__name__, args, exc_info=True)
+                self.progress.count("retried")
+                time.sleep(self.RETRY_DELAY * 2 ** attempt)
+
+    def _claim(self, title):
+        """
+        Returns future the song is loaded into and whether the caller has to load it
+        """
+        with self.lock:
+            if title in self.loading:
+                return self.loading[title], False
+            future = self.loading[title] = Future()
+        future.add_done_callback(lambda done: self._release(title, done))
+        return future, True
+
+    def _release(self, title, future):
+        with self.lock:
+            if self.loading.get(title) is future:
+                del self.loading[title]
+
+    def _record(self, query, state, **values):
+        if self.journal:
+            self.journal.set(query, state, **values)
+
+    def _search(self, query):
+        if self.lookups:
+            return self.lookups.search(self.extractor, query)
+        return self.extractor.search(query)
+
+    def _fetch(self, query, check):
+        """
+        Searches and downloads the song found for query, runs on a download worker.
+        Returns future of the song title, None if the song failed.
+        """
+        future = None
+        try:
+            state, video_id, title, url, path = (self.journal and self.journal.get(query)) or (None,) * 5
+            if state in (CONVERTED, SKIPPED) and self.index.contains(title + ".mp3"):
+                # loaded by an earlier run
+                future = Future()
+                self._finish(future, title, "skipped")
+                return future
+            if state == DOWNLOADED and os.path.exists(path):
+                future, claimed = self._claim(title)
+                if claimed:
+                    self.converters.submit(self._convert, query, future, video_id, title, path)
+                    return future
+            if state not in (SEARCHED, DOWNLOADED):
+                video_id, title, url = self._retry(self._search, query)
+                self._record(query, SEARCHED, video_id=video_id, title=title, url=url)
+            self.progress.count("searched")
+            local_title = self.lookups and self.lookups.local_title(self.index, video_id)
+            if local_title:
+                # video was downloaded before, maybe found by another query
+                future = Future()
+                self._record(query, SKIPPED, video_id=video_id, title=local_title, url=url)
+                self._finish(future, local_title, "skipped")
+                return future
+            future, claimed = self._claim(title)
+            if not claimed:
+                self.progress.count("skipped")
+                self.slots.release()
+                return future
+            if check and self.index.contains(title + ".mp3"):
+                # don't download if we already have one
+                self._record(query, SKIPPED, video_id=video_id, title=title, url=url)
+                self._finish(future, title, "skipped")
+                return future
+            title, path = self._retry(self.extractor.download, url)
+            self._record(query, DOWNLOADED, video_id=video_id, title=title, url=url, path=path)
+            self.progress.count("downloaded")
+            self.converters.submit(self._convert, query, future, video_id, title, path)
+            return future
+        except Exception as e:
+            logger.debug("Loading %s failed", query, exc_info=True)
+            self._record(query, FAILED, error=str(e))
+            self.progress.fail(query, e)
+            self._finish(future, None)
+            return future
+
+    def _convert(self, query, future, video_id, title, path):
+        try:
+            filename = title + ".mp3"
+            self._retry(self.extractor.convert, path, filename, self.index.place)
+            if self.lookups:
+                self.lookups.put_file(video_id, filename)
+            self._record(query, CONVERTED, video_id=video_id, title=title)
+            self._finish(future, title, "converted")
+        except Exception as e:
+            logger.debug("Converting %s failed", path, exc_info=True)
+            self._record(query, FAILED, error=str(e))
+            self.progress.fail(query, e)
+            self._finish(future, None)
+
+    def _finish(self, future, title, stage=None):
+        if stage:
+            self.progress.count(stage)
+        if future is not None:
+            future.set_result(title)
+        self.slots.release()
+
+    @staticmethod
+    def _title(fetch):
+        future = fetch.result()
+        return future.result() if future is not None else None
+
+    def load(self, queries, check=False, total=None):
+        """
+        Loads songs found for queries, yields their titles in the order of queries, None for songs that failed.
+        Queries are taken as they are needed, so any iterable can be loaded in memory that doesn't depend on its size.
+        With check songs already in the library aren't downloaded again.
+        """
+        self.progress = LoadProgress(total, self.progress_stream)
+        # files written by the pipeline are added to the index, changes made before have to be in it already
+        self.index.refresh()
+        # titles are yielded in order, a song that takes long holds back at most this many songs behind it
+        window = 4 * self.max_pending
+        fetched = deque()
+        for query in queries:
+            if len(fetched) >= window:
+                yield self._title(fetched.popleft())
+            # released once the song is loaded or failed
+            self.slots.acquire()
+            fetched.append(self.downloaders.submit(self._fetch, query, check))
+        while fetched:
+            yield self._title(fetched.popleft())
+        self.progress.finish()
+
+    def shutdown(self):
+        self.downloaders.shutdown()
+        self.converters.shutdown()
@@ -0,0 +1,72 @@
+import time
+from threading import Lock
+
+from term_music.db import open_db
+from term_music.library_index import LibraryIndex
+
+
+class LookupCache:
+    """
+    SQLite cache of youtube lookups: the video found for a query and the song file downloaded from a video.
+    Queries are matched case and whitespace insensitively, videos found for them are forgotten after ttl seconds so
+    a query can find a newer video. Songs are looked up by video, so a video found by another query isn't downloaded
+    again while its song is in the library.
+    """
+
+    VERSION = 1
+    TABLES = {
+        "searches": ["CREATE TABLE IF NOT EXISTS searches (query TEXT PRIMARY KEY, video_id TEXT NOT NULL, "
+                     "title TEXT NOT NULL, url TEXT NOT NULL, created REAL NOT NULL)"],
+        "videos": ["CREATE TABLE IF NOT EXISTS videos (video_id TEXT PRIMARY KEY, filename TEXT NOT NULL)"],
+    }
+
+    def __init__(self, db_path, ttl=30 * 24 * 60 * 60):
+        self.ttl = ttl
+        self.lock = Lock()
+        self.db = open_db(db_path, self.VERSION, self.TABLES)
+        with self.db:
+            self.db.execute("DELETE FROM searches WHERE created < ?", (time.time() - self.ttl,))
+
+    @staticmethod
+    def normalize(query):
+        return " ".join(query.casefold().split())
+
+    def get(self, query):
+        """
+        Returns (video id, title, url) found for query, None if it wasn't searched or the result expired
+        """
+        with self.lock:
+            return self.db.execute("SELECT video_id, title, url FROM searches WHERE query = ? AND created >= ?",
+                                   (self.normalize(query), time.time() - self.ttl)).fetchone()
+
+    def put(self, query, video_id, title, url):
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?, ?)",
+                            (self.normalize(query), video_id, title, url, time.time()))
+
+    def search(self, extractor, query):
+        """
+        Returns (video id, title, url) found for query, the extractor is only asked if the cache has no result
+        """
+        found = self.get(query)
+        if found is None:
+            found = extractor.search(query)
+            self.put(query, *found)
+        return found
+
+    def put_file(self, video_id, filename):
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO videos VALUES (?, ?)", (video_id, filename))
+
+    def local_title(self, index: LibraryIndex, video_id):
+        """
+        Title of the song downloaded from the video, None if there is none or it is no longer in the library
+        """
+        with self.lock:
+            row = self.db.execute("SELECT filename FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+        if row is None or not index.contains(row[0]):
+            return None
+        return row[0][:-4]
+
+    def close(self):
+        self.db.close()
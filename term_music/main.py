@@ -8,6 +8,7 @@ from term_music.commands import Commands
 import argparse
 
 from term_music.config import Config
+from term_music.profiler import PROFILER
 
 version = '0.2.1'
 
@@ -24,6 +25,9 @@ def main():
                                      description="Music player and library manager. "
                                                  "Starts the player in no songs mode if no arguments are given.")
     parser.add_argument("-v", "--version", action="version", version=f"%(prog)s {version}")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="time decoding, frames, drawing, player commands and library scans and write them to "
+                             "FILE as a Chrome trace on exit")
 
     subparsers = parser.add_subparsers(dest="command")
     parser_play = subparsers.add_parser("play", help="play a song")
@@ -47,9 +51,13 @@ def main():
     parser_list.add_argument("-a", "--all", action="store_true", help="list all songs and playlists")
     parser_list.add_argument("-p", "--playlist", action="store_true", help="list only playlists")
     parser_list.add_argument("-f", "--full", action="store_true", help="list all songs with playlists they are on")
+    parser_list.add_argument("-c", "--contains", metavar="SONG", help="list playlists the song is on")
+    parser_list.add_argument("-o", "--orphans", action="store_true", help="list songs that aren't on any playlist")
 
     parser_load = subparsers.add_parser("load", help="download a list of songs")
-    parser_load.add_argument("songs", nargs="+", help="list of songs to download in music library")
+    parser_load.add_argument("songs", nargs="*", help="list of songs to download in music library")
+    parser_load.add_argument("-f", "--file", help="file with a song to download on every line, - reads songs from "
+                                                  "standard input")
     parser_load.add_argument("-p", "--playlist", help="name of the playlist that will be made out of downloaded songs")
     parser_load.add_argument("-c", "--check", help="if true will check if song already exists and won't download it",
                              action="store_true")
@@ -59,8 +67,16 @@ def main():
     parser_search.add_argument("-", "--type", choices=["songs", "playlists"], help="search only songs or playlists")
 
     args = parser.parse_args()
-    commands = Commands(config)
-    commands.run_command(args.command, args)
+    if args.profile:
+        PROFILER.enable()
+    try:
+        commands = Commands(config)
+        commands.run_command(args.command, args)
+    finally:
+        if args.profile:
+            PROFILER.export(args.profile)
+            print(PROFILER.report())
+            print(f"Trace written to {args.profile}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,112 @@
+from collections import OrderedDict
+from threading import Event, Lock
+
+
+class MemoryCache:
+    """
+    Thread safe in-memory LRU cache bounded by the total size of its values.
+    Size of a value is measured with sizeof when it is added and again every time it is read, so values that grow
+    are accounted for. Value created by get_or_create is created only once even when several threads ask for it.
+    """
+
+    def __init__(self, max_size, sizeof, on_evict=None):
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.on_evict = on_evict
+        self.entries = OrderedDict()  # key -> [value, size]
+        self.pending = {}  # key -> event set once the value is created
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        size = self.sizeof(entry[0])
+        self.size += size - entry[1]
+        entry[1] = size
+        return entry[0]
+
+    def _put(self, key, value):
+        evicted = []
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= old[1]
+            if old[0] is not value:
+                evicted.append(old[0])
+        size = self.sizeof(value)
+        if size > self.max_size:
+            # would evict everything else and itself
+            return evicted
+        self.entries[key] = [value, size]
+        self.size += size
+        while self.size > self.max_size:
+            _, (evicted_value, evicted_size) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+            evicted.append(evicted_value)
+        return evicted
+
+    def _evicted(self, values):
+        if self.on_evict:
+            for value in values:
+                self.on_evict(value)
+
+    def get(self, key):
+        with self.lock:
+            return self._get(key)
+
+    def put(self, key, value):
+        with self.lock:
+            evicted = self._put(key, value)
+        self._evicted(evicted)
+
+    def get_or_create(self, key, create):
+        while True:
+            with self.lock:
+                if key in self.entries:
+                    return self._get(key)
+                event = self.pending.get(key)
+                if event is None:
+                    self.misses += 1
+                    event = self.pending[key] = Event()
+                    break
+            # another thread is creating the value
+            event.wait()
+        try:
+            value = create()
+            self.put(key, value)
+            return value
+        finally:
+            with self.lock:
+                del self.pending[key]
+            event.set()
+
+    def pop(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return None
+            self.size -= entry[1]
+        self._evicted([entry[0]])
+        return entry[0]
+
+    def clear(self):
+        with self.lock:
+            evicted = [value for value, _ in self.entries.values()]
+            self.entries.clear()
+            self.size = 0
+        self._evicted(evicted)
+
+    def stats(self):
+        return {"entries": len(self.entries), "size": self.size, "hits": self.hits, "misses": self.misses}
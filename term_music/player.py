@@ -1,60 +1,277 @@
-import time
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 from queue import Queue, Empty
 
+import pygame
 from pygame import mixer
 
 from term_music.app_data import Data
+from term_music.clock import MixerClock
+from term_music.domain.song import Song
+from term_music.profiler import PROFILER
+
+logger = logging.getLogger(__name__)
 
 
 class Player:
+    """
+    Player worker, run applies commands put in the play queue until QUIT.
+    on_end is called from the worker when a song ends on its own or is stopped.
+    Song queued with QUEUE starts as soon as the current one ends and on_advance is called instead of on_end.
+    With gapless the mixer starts the queued song itself, with crossfade the current song fades out over the first
+    crossfade milliseconds of the queued one.
+    The tail a song fades out with is decoded on a worker, TAIL hands it to the player once it is ready, so loading a
+    song doesn't wait for ffprobe and ffmpeg. Tails of queued songs are prepared as soon as they are queued.
+    With both, the queued song is only handed to the mixer once the current song turns out to have no tail.
+    """
+    PLAY = 'PLAY'
+    QUEUE = 'QUEUE'
     STOP = 'STOP'
     PAUSE = 'PAUSE'
     UNPAUSE = 'UNPAUSE'
+    QUIT = 'QUIT'
+    TAIL = 'TAIL'
+    END_EVENT = pygame.USEREVENT + 1
+    # longest time the end of a song waits to be noticed
+    END_CHECK_INTERVAL = 0.05
 
-    def __init__(self, data: Data):
+    def __init__(self, data: Data, on_end=None, on_advance=None, gapless=False, crossfade=0):
         mixer.init()
         self.data = data
+        self.on_end = on_end
+        self.on_advance = on_advance
         self.play_queue = Queue()
         self.paused = False
+        self.playing = False
+        self.end_events = self.init_end_events()
+        # without end events there is no way to tell the mixer moved on to the queued song
+        self.gapless = gapless and self.end_events
+        self.crossfade = crossfade
+        self.current = None
+        self.queued = None
+        self.handed = False  # whether the queued song was handed to the mixer to start on its own
+        self.fade_at = None  # position in ms at which the current song starts fading into the queued one
+        self.tail = None  # sound of the current song from fade_at to its end
+        self.tails = {}  # path -> future of (fade_at, tail) of the current and queued songs, None if they have none
+        self.tail_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="CROSSFADE") if crossfade else None
+
+    @staticmethod
+    def init_end_events():
+        """
+        Makes mixer post END_EVENT when a song ends, returns False if pygame's event queue isn't available
+        """
+        # event queue needs the video subsystem, the dummy driver provides it without a window
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        try:
+            pygame.display.init()
+        except pygame.error:
+            return False
+        mixer.music.set_endevent(Player.END_EVENT)
+        return True
+
+    def put(self, command, argument=None):
+        # sent time is kept to record how long commands take to be applied
+        self.play_queue.put((command, argument, PROFILER.now()))
 
-    def put(self, command):
-        self.play_queue.put(command)
+    def play(self, path):
+        self.put(self.PLAY, path)
+
+    def queue(self, path):
+        self.put(self.QUEUE, path)
 
     def stop(self):
-        self.play_queue.put(self.STOP)
+        self.put(self.STOP)
 
     def pause(self):
-        self.play_queue.put(self.PAUSE)
+        self.put(self.PAUSE)
 
     def unpause(self):
-        self.play_queue.put(self.UNPAUSE)
+        self.put(self.UNPAUSE)
+
+    def quit(self):
+        self.put(self.QUIT)
 
     def is_paused(self):
         return self.paused
 
-    def play(self, path):
+    @staticmethod
+    def position():
+        """
+        Playback position of the current song in milliseconds, mixer restarts it when a queued song starts
+        """
+        # same position the renderer draws frames at
+        return MixerClock.position()
+
+    def ended(self):
+        if self.end_events:
+            # events are pushed by the mixer, no need to pump the event loop from this thread
+            return len(pygame.event.get(self.END_EVENT, pump=False)) > 0
+        return not mixer.music.get_busy() and not self.paused
+
+    def _load(self, path, fade_ms=0):
+        if self.end_events:
+            pygame.event.clear(self.END_EVENT, pump=False)
         mixer.music.load(path)
-        mixer.music.play()
+        mixer.music.play(fade_ms=fade_ms)
+        self.paused = False
+        self.playing = True
+        self.current = path
+        self.queued = None
+        self.handed = False
+        self._prepare_crossfade(path)
+
+    def _prepare_tail(self, path):
+        """
+        Starts decoding the tail of path on the crossfade worker unless it already is
+        """
+        if path not in self.tails:
+            self.tails[path] = self.tail_executor.submit(self._decode_tail, path)
+        return self.tails[path]
+
+    def _decode_tail(self, path):
+        try:
+            duration = Song(path).duration() * 1000
+            if duration <= 2 * self.crossfade:
+                return None
+            frequency, _, channels = mixer.get_init()
+            tail = Song(path).stream((duration - self.crossfade) / 1000, frequency, channels)
+            return duration - self.crossfade, mixer.Sound(buffer=b"".join(tail))
+        except Exception:
+            logger.debug("Preparing crossfade of %s failed", path, exc_info=True)
+            return None
+
+    def _prepare_crossfade(self, path):
+        """
+        Current song plays without a tail until TAIL hands it over
+        """
+        self.fade_at = None
+        self.tail = None
+        if not self.crossfade:
+            return
+        for stale in [stale for stale in self.tails if stale != path]:
+            self.tails.pop(stale).cancel()
+        self._prepare_tail(path).add_done_callback(lambda _: self.put(self.TAIL, path))
+
+    def _use_tail(self, path):
+        future = self.tails.get(path)
+        if path != self.current or self.fade_at is not None or future is None:
+            return
+        if not future.done() or future.cancelled():
+            return
+        prepared = future.result()
+        if prepared:
+            self.fade_at, self.tail = prepared
+        else:
+            self._hand_over()
+
+    def _hand_over(self):
+        """
+        Hands the queued song to the mixer for gapless playback, unless the current song may still fade into it
+        """
+        if not self.gapless or not self.queued or self.handed or self.fade_at is not None:
+            return
+        if self.crossfade:
+            # waits for the tail of the current song, the song is handed over if it has none
+            future = self.tails.get(self.current)
+            if future is not None and not (future.done() and (future.cancelled() or future.result() is None)):
+                return
+        mixer.music.queue(self.queued)
+        self.handed = True
+
+    def _queue(self, path):
+        self.queued = path
+        self.handed = False
+        if self.crossfade:
+            self._prepare_tail(path)
+        self._hand_over()
+
+    def _unload(self):
+        mixer.music.stop()
+        mixer.music.unload()
+        # stops the fading tail of the previous song
+        mixer.stop()
         self.paused = False
-        while self.data.running():
+        self.playing = False
+        self.current = None
+        self.queued = None
+        self.handed = False
+
+    def _end(self):
+        self._unload()
+        if self.on_end:
+            self.on_end()
+
+    def _advance(self):
+        if self.on_advance:
+            self.on_advance()
+
+    def _fade(self):
+        """
+        Hands the end of the current song over to its tail sound fading out and fades the queued song in
+        """
+        self.tail.play()
+        self.tail.fadeout(self.crossfade)
+        self._load(self.queued, self.crossfade)
+        self._advance()
+
+    def _timeout(self):
+        if not self.playing:
+            return None
+        if self.fade_at is not None and self.queued and not self.paused:
+            # wake up right when the fade should start
+            return min(max((self.fade_at - self.position()) / 1000, 0), self.END_CHECK_INTERVAL)
+        return self.END_CHECK_INTERVAL
+
+    def run(self):
+        while True:
             try:
-                command = self.play_queue.get_nowait()
-                if command == self.STOP:
-                    mixer.music.stop()
-                    mixer.music.unload()
-                    return
-                elif command == self.PAUSE:
-                    mixer.music.pause()
-                    self.paused = True
-                elif command == self.UNPAUSE:
-                    mixer.music.unpause()
-                    self.paused = False
+                # blocks until a command comes in, while playing wakes up now and then to check if the song ended
+                command, argument, sent = self.play_queue.get(timeout=self._timeout())
             except Empty:
-                if not mixer.music.get_busy() and not self.paused:
-                    mixer.music.stop()
-                    mixer.music.unload()
-                    return
-                time.sleep(1e-6)
-        if mixer.music.get_busy() or self.paused:
-            mixer.music.stop()
-            mixer.music.unload()
+                command, argument, sent = None, None, 0
+            if command == self.QUIT:
+                if self.playing:
+                    self._unload()
+                if self.tail_executor:
+                    for future in self.tails.values():
+                        future.cancel()
+                    self.tail_executor.shutdown(wait=False)
+                return
+            elif command == self.PLAY:
+                if self.playing:
+                    self._unload()
+                self._load(argument)
+            elif not self.playing:
+                continue
+            elif command == self.TAIL:
+                self._use_tail(argument)
+            elif command == self.QUEUE:
+                self._queue(argument)
+            elif command == self.STOP:
+                self._end()
+            elif command == self.PAUSE:
+                mixer.music.pause()
+                mixer.pause()
+                self.paused = True
+            elif command == self.UNPAUSE:
+                mixer.music.unpause()
+                mixer.unpause()
+                self.paused = False
+            if sent:
+                PROFILER.since(f"player {command}", sent, "player")
+            if not self.playing:
+                continue
+            if self.fade_at is not None and self.queued and not self.paused and self.position() >= self.fade_at:
+                self._fade()
+            elif self.ended():
+                if self.handed and mixer.music.get_busy():
+                    # mixer already started the queued song
+                    self.current, self.queued, self.handed = self.queued, None, False
+                    self._prepare_crossfade(self.current)
+                    self._advance()
+                elif self.queued:
+                    self._load(self.queued)
+                    self._advance()
+                else:
+                    self._end()
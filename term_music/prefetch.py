@@ -0,0 +1,88 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from term_music.app_data import Data
+from term_music.domain.song import Song
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """
+    Prepares songs queued after the current one on a worker pool while the current one plays.
+    Song files are read so they are in the os file cache and all of their frames are computed with load_frames.
+    At most depth songs are prepared ahead, preparing stops once prepared frames take max_size bytes.
+    """
+
+    READ_SIZE = 1024 * 1024
+
+    def __init__(self, data: Data, load_frames, depth=2, max_size=32 * 1024 * 1024, workers=2):
+        self.data = data
+        self.load_frames = load_frames
+        self.depth = depth
+        self.max_size = max_size
+        self.executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="PREFETCH")
+        self.futures = {}  # path -> future of prepared frame stream
+        self.lock = Lock()
+        self.preparing = {}  # path -> frame stream being filled, closed on shutdown so the decode stops
+        self.stopped = False
+
+    def upcoming(self):
+        snapshot = self.data.snapshot()
+        end = min(snapshot.current + 1 + self.depth, snapshot.length())
+        return [snapshot.path_at(i) for i in range(snapshot.current + 1, end)]
+
+    def prefetch(self):
+        """
+        Schedules preparation of upcoming songs, should be called whenever the current song or the queue changes
+        """
+        if self.depth <= 0:
+            return
+        upcoming = self.upcoming()
+        for path in list(self.futures):
+            if path not in upcoming:
+                self.futures.pop(path).cancel()
+        for path in upcoming:
+            if path in self.futures:
+                continue
+            if self.prepared_size() >= self.max_size:
+                break
+            self.futures[path] = self.executor.submit(self.prepare, path)
+
+    def prepared_size(self):
+        size = 0
+        for future in self.futures.values():
+            if future.done() and not future.cancelled() and future.exception() is None and future.result():
+                size += future.result().nbytes()
+        return size
+
+    def prepare(self, path):
+        try:
+            with open(path, "rb") as f:
+                while f.read(self.READ_SIZE):
+                    pass
+            frames, _ = self.load_frames(Song(path))
+            with self.lock:
+                if self.stopped:
+                    return None
+                self.preparing[path] = frames
+            try:
+                return frames.fill()
+            finally:
+                with self.lock:
+                    self.preparing.pop(path, None)
+        except Exception:
+            logger.debug("Prefetching %s failed", path, exc_info=True)
+            return None
+
+    def shutdown(self):
+        with self.lock:
+            self.stopped = True
+            preparing = list(self.preparing.values())
+        for frames in preparing:
+            frames.close()
+        for future in self.futures.values():
+            future.cancel()
+        self.futures = {}
+        self.executor.shutdown(wait=False)
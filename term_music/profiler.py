@@ -0,0 +1,239 @@
+import json
+import threading
+import time
+from threading import Lock
+
+
+class NullSpan:
+    """
+    Span handed out while the profiler is disabled, records nothing
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    """
+    Times the code run in a with block, args are shown with the span in the trace
+    """
+    __slots__ = ("profiler", "name", "category", "args", "start")
+
+    def __init__(self, profiler, name, category, args):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, self.category, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+    def set(self, **args):
+        """
+        Adds args known only once the span ran, e.g. bytes decoded
+        """
+        self.args.update(args)
+
+
+class ProfiledLock:
+    """
+    Lock that records the time threads waited for it, acquires that didn't wait aren't recorded
+    """
+
+    def __init__(self, profiler, lock, name):
+        self.profiler = profiler
+        self.lock = lock
+        self.name = name
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self.lock.acquire(False):
+            return True
+        if not blocking:
+            return False
+        start = time.perf_counter_ns()
+        acquired = self.lock.acquire(True, timeout)
+        self.profiler.add(self.name, "lock", start, time.perf_counter_ns(), {})
+        return acquired
+
+    def release(self):
+        self.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+
+class Profiler:
+    """
+    Records spans (timed sections of the hot paths) and counters while enabled and exports them as a Chrome trace,
+    which chrome://tracing and Perfetto open, with a summary of the durations of each span.
+    Disabled it records nothing: a span is a shared no-op and costs a single check.
+    Spans with a bytes arg are summarized per MB as well, e.g. decode time per MB of decoded audio.
+    """
+    # events kept at most, a long session shouldn't grow without bound
+    MAX_EVENTS = 1000000
+    # upper edges of the summary histogram buckets in milliseconds
+    BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, float("inf"))
+    SPAN = "X"
+    COUNTER = "C"
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = Lock()
+        self.events = []  # (type, name, category, thread id, start ns, end ns, args)
+        self.dropped = 0
+        self.threads = {}  # thread id -> name
+        self.origin = 0
+
+    def enable(self):
+        self.origin = time.perf_counter_ns()
+        self.enabled = True
+
+    def now(self):
+        """
+        Start of a span that ends on another thread, see since. 0 while disabled
+        """
+        return time.perf_counter_ns() if self.enabled else 0
+
+    def span(self, name, category="app", **args):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, category, args)
+
+    def since(self, name, start, category="app", **args):
+        """
+        Records a span from start, taken with now, until now
+        """
+        if self.enabled and start:
+            self.add(name, category, start, time.perf_counter_ns(), args)
+
+    def counter(self, name, value, category="app"):
+        if self.enabled:
+            now = time.perf_counter_ns()
+            self._append((self.COUNTER, name, category, now, now, {name: value}))
+
+    def wrap_lock(self, lock, name):
+        """
+        Lock that records waits for it while enabled, lock itself while disabled
+        """
+        return ProfiledLock(self, lock, name) if self.enabled else lock
+
+    def add(self, name, category, start, end, args):
+        self._append((self.SPAN, name, category, start, end, args))
+
+    def _append(self, event):
+        thread = threading.current_thread()
+        kind, name, category, start, end, args = event
+        with self.lock:
+            if len(self.events) >= self.MAX_EVENTS:
+                self.dropped += 1
+                return
+            self.threads[thread.ident] = thread.name
+            self.events.append((kind, name, category, thread.ident, start, end, args))
+
+    @staticmethod
+    def percentile(durations, p):
+        return durations[min(int(p * len(durations)), len(durations) - 1)]
+
+    def summary(self):
+        """
+        Count, total and percentiles in milliseconds and histogram of durations of every span name
+        """
+        spans = {}
+        with self.lock:
+            for kind, name, _, _, start, end, args in self.events:
+                if kind == self.SPAN:
+                    spans.setdefault(name, []).append(((end - start) / 1e6, args.get("bytes")))
+        summary = {}
+        for name, samples in sorted(spans.items()):
+            durations = sorted(duration for duration, _ in samples)
+            histogram = dict.fromkeys((f"<={edge}ms" for edge in self.BUCKETS), 0)
+            for duration in durations:
+                edge = next(edge for edge in self.BUCKETS if duration <= edge)
+                histogram[f"<={edge}ms"] += 1
+            stats = {
+                "count": len(durations),
+                "total_ms": sum(durations),
+                "p50_ms": self.percentile(durations, 0.5),
+                "p99_ms": self.percentile(durations, 0.99),
+                "max_ms": durations[-1],
+                "histogram": {bucket: count for bucket, count in histogram.items() if count},
+            }
+            size = sum(size for _, size in samples if size)
+            if size:
+                stats["ms_per_mb"] = sum(duration for duration, size in samples if size) / (size / 2 ** 20)
+            summary[name] = stats
+        return summary
+
+    def counters(self):
+        """
+        Last value of every counter
+        """
+        with self.lock:
+            return {name: args[name] for kind, name, _, _, _, _, args in self.events if kind == self.COUNTER}
+
+    def report(self):
+        """
+        Summary as a table, one line per span name, followed by the last value of every counter
+        """
+        lines = ["{:24s} {:>8s} {:>10s} {:>9s} {:>9s} {:>9s} {:>9s}".format(
+            "Span", "Count", "Total ms", "p50 ms", "p99 ms", "Max ms", "ms/MB")]
+        for name, stats in self.summary().items():
+            per_mb = "{:9.2f}".format(stats["ms_per_mb"]) if "ms_per_mb" in stats else "{:>9s}".format("-")
+            lines.append("{:24s} {:8d} {:10.1f} {:9.3f} {:9.3f} {:9.3f} {}".format(
+                name[:24], stats["count"], stats["total_ms"], stats["p50_ms"], stats["p99_ms"], stats["max_ms"],
+                per_mb))
+        counters = self.counters()
+        if counters:
+            lines.append("{:24s} {:>8s}".format("Counter", "Value"))
+        for name, value in sorted(counters.items()):
+            lines.append("{:24s} {:>8}".format(name[:24], value))
+        if self.dropped:
+            lines.append(f"{self.dropped} events weren't recorded, more than {self.MAX_EVENTS} were")
+        return "\n".join(lines)
+
+    def trace(self):
+        """
+        Recorded events in Chrome trace event format, timestamps are microseconds since the profiler was enabled
+        """
+        with self.lock:
+            events = list(self.events)
+            threads = dict(self.threads)
+        trace = [{"ph": "M", "name": "thread_name", "pid": 1, "tid": tid, "args": {"name": name}}
+                 for tid, name in threads.items()]
+        for kind, name, category, tid, start, end, args in events:
+            event = {"ph": kind, "name": name, "cat": category, "pid": 1, "tid": tid,
+                     "ts": (start - self.origin) / 1000, "args": args}
+            if kind == self.SPAN:
+                event["dur"] = (end - start) / 1000
+            trace.append(event)
+        return trace
+
+    def export(self, path):
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.trace(), "displayTimeUnit": "ms",
+                       "otherData": {"dropped_events": self.dropped}, "summary": self.summary(),
+                       "counters": self.counters()}, f)
+
+
+# profiler of the running app, enabled by --profile
+PROFILER = Profiler()
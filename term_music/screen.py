@@ -0,0 +1,144 @@
+import re
+import sys
+
+import numpy as np
+from blessed import Terminal
+
+
+class Screen:
+    """
+    Buffered terminal output.
+    Keeps a back buffer of what was drawn in the previous frame and only queues cells and lines that changed since,
+    everything queued for a frame is written to the terminal with a single write on flush.
+    """
+
+    def __init__(self, terminal: Terminal, stream=None):
+        self.t = terminal
+        self.stream = stream
+        self.parts = []
+        self.bars_drawn = None  # bool grid of bar cells lit in the previous frame
+        self.lines_drawn = {}  # (y, x) -> text of lines drawn in the previous frame
+        self.lines_touched = set()
+
+    def invalidate(self):
+        """
+        Forgets the back buffer, should be called whenever the terminal was cleared outside of this screen
+        """
+        self.bars_drawn = None
+        self.lines_drawn = {}
+        self.lines_touched = set()
+
+    def clear(self):
+        self.parts.append(self.t.home + self.t.clear)
+        self.invalidate()
+
+    def bars(self, heights, height, char):
+        """
+        Queues bars growing from row height - 1 upwards, one bar per column
+        """
+        heights = np.asarray(heights)
+        lit = np.arange(height)[::-1, np.newaxis] < heights[np.newaxis, :]
+        drawn = self.bars_drawn
+        if drawn is None or drawn.shape != lit.shape:
+            drawn = np.zeros(lit.shape, dtype=bool)
+        rows, cols = (axis.tolist() for axis in np.nonzero(lit != drawn))
+        run_start = 0
+        for k in range(1, len(rows) + 1):
+            # changed cells that are next to each other in a row are written as one run
+            if k < len(rows) and rows[k] == rows[k - 1] and cols[k] == cols[k - 1] + 1:
+                continue
+            y, x = rows[run_start], cols[run_start]
+            run = lit[y, x:cols[k - 1] + 1].tolist()
+            self.parts.append(self.t.move_yx(y, x) + "".join(char if cell else " " for cell in run))
+            run_start = k
+        self.bars_drawn = lit
+
+    def line(self, y, x, text):
+        """
+        Queues text at y, x, rest of the terminal line is erased
+        """
+        self.lines_touched.add((y, x))
+        if self.lines_drawn.get((y, x)) != text:
+            self.parts.append(self.t.move_yx(y, x) + text + self.t.clear_eol)
+            self.lines_drawn[(y, x)] = text
+
+    def keep_lines(self):
+        """
+        Keeps lines drawn in the previous frame on the screen without queueing them again
+        """
+        self.lines_touched.update(self.lines_drawn)
+
+    def flush(self):
+        # lines drawn in the previous frame but not in this one are erased
+        for y, x in set(self.lines_drawn) - self.lines_touched:
+            self.parts.append(self.t.move_yx(y, x) + self.t.clear_eol)
+            del self.lines_drawn[(y, x)]
+        self.lines_touched = set()
+        if self.parts:
+            stream = self.stream or sys.stdout
+            stream.write("".join(self.parts))
+            stream.flush()
+            self.parts = []
+
+
+class MemorySink:
+    """
+    Output stream that keeps what would be on the terminal in memory, for rendering without one.
+    Escape sequences the screen writes are applied to a grid of cells: cursor moves, erasing the rest of a line and
+    clearing the screen. Styles and other sequences are dropped. Size of every write is recorded, the screen writes
+    once per frame.
+    """
+    # control sequences and charset selections
+    SEQUENCE = re.compile(r"\x1b(?:\[([0-9;?]*)([@-~])|[()][0-9A-Za-z])")
+
+    def __init__(self):
+        self.rows = {}  # y -> {x -> character}
+        self.y = 0
+        self.x = 0
+        self.writes = []  # bytes of every write
+
+    def write(self, text):
+        self.writes.append(len(text.encode()))
+        start = 0
+        for match in self.SEQUENCE.finditer(text):
+            self._put(text[start:match.start()])
+            self._apply(*match.groups())
+            start = match.end()
+        self._put(text[start:])
+
+    def flush(self):
+        pass
+
+    def _put(self, text):
+        for char in text:
+            if char == "\n":
+                self.y, self.x = self.y + 1, 0
+            elif char == "\r":
+                self.x = 0
+            else:
+                self.rows.setdefault(self.y, {})[self.x] = char
+                self.x += 1
+
+    def _apply(self, parameters, command):
+        if command == "H":
+            y, _, x = (parameters or "").partition(";")
+            self.y, self.x = int(y or 1) - 1, int(x or 1) - 1
+        elif command == "K":
+            row = self.rows.get(self.y, {})
+            for x in [x for x in row if x >= self.x]:
+                del row[x]
+        elif command == "J" and parameters == "2":
+            self.rows = {}
+
+    def bytes_written(self):
+        return sum(self.writes)
+
+    def lines(self):
+        """
+        Text shown on every line up to the last one written, trailing spaces removed
+        """
+        rows = {y: row for y, row in self.rows.items() if row}
+        if not rows:
+            return []
+        return ["".join(rows[y].get(x, " ") for x in range(max(rows[y]) + 1)).rstrip() if y in rows else ""
+                for y in range(max(rows) + 1)]
@@ -0,0 +1,239 @@
+import bisect
+from collections import defaultdict
+
+import numpy as np
+
+
+class SearchIndex:
+    """
+    Ranked search over titles.
+    Titles are indexed by trigrams of their lower case utf-8 text padded with spaces and by their words. Matches are
+    ranked by kind (exact title, title prefix, all query words, substring, similar title) and then by the share of
+    trigrams query and title have in common. Titles with a word one typo away from every query word are similar too.
+    Trigrams are kept as sorted integer codes with the ids of titles containing each of them, a query counts common
+    trigrams of all titles at once with numpy.
+    """
+    EXACT = 4
+    PREFIX = 3
+    TOKEN = 2
+    SUBSTRING = 1
+    FUZZY = 0
+    # least share of common trigrams (dice coefficient) for a title to be similar to the query
+    MIN_SIMILARITY = 0.4
+    # shorter query words have to be spelled right
+    MIN_TYPO_LENGTH = 4
+
+    def __init__(self, titles):
+        self.titles = list(titles)
+        self.folded = [title.lower() for title in self.titles]
+        count = len(self.titles)
+        # prefix matches are a range of titles sorted by folded text
+        sorted_ids = sorted(range(count), key=self.folded.__getitem__)
+        self.sorted_folded = [self.folded[i] for i in sorted_ids]
+        self.sorted_ids = np.array(sorted_ids, dtype=np.int64)
+        tokens = defaultdict(list)
+        for i, folded in enumerate(self.folded):
+            for token in set(folded.split()):
+                tokens[token].append(i)
+        self.tokens = {token: np.array(ids, dtype=np.int64) for token, ids in tokens.items()}
+        self.deletes = None  # word with a letter deleted -> words, built on the first typo
+
+        encoded = [f" {folded} ".encode() for folded in self.folded]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=count)
+        codes = self.codes(b"".join(encoded))
+        owners = np.repeat(np.arange(count, dtype=np.int64), lengths)[:len(codes)]
+        # trigrams running over the end of a title into the next one are dropped
+        valid = np.arange(len(codes)) + 3 <= np.cumsum(lengths)[owners]
+        pairs = np.sort(codes[valid] * max(count, 1) + owners[valid])
+        # a trigram repeated in a title counts once
+        pairs = pairs[self.starts(pairs)]
+        codes = pairs // max(count, 1)
+        self.owners = pairs % max(count, 1)  # title ids grouped by trigram code
+        starts = self.starts(codes)
+        self.grams = codes[starts]
+        self.offsets = np.append(starts, len(codes))
+        self.trigram_counts = np.bincount(self.owners, minlength=count)
+
+    def __len__(self):
+        return len(self.titles)
+
+    @staticmethod
+    def starts(values):
+        """
+        Positions at which runs of equal values in sorted values start
+        """
+        if not len(values):
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(np.concatenate(([True], values[1:] != values[:-1])))
+
+    @staticmethod
+    def distinct(values):
+        """
+        Sorted distinct values, sorting is faster than np.unique for the small integer arrays searches deal with
+        """
+        values = np.sort(values)
+        return values[SearchIndex.starts(values)]
+
+    @staticmethod
+    def codes(data: bytes):
+        """
+        Integer code of every trigram of data
+        """
+        data = np.frombuffer(data, dtype=np.uint8).astype(np.int64)
+        return data[:-2] << 16 | data[1:-1] << 8 | data[2:]
+
+    def _postings(self, codes):
+        """
+        Ids of titles containing each of the trigram codes, one array per code
+        """
+        positions = np.searchsorted(self.grams, codes)
+        found = positions < len(self.grams)
+        found[found] = self.grams[positions[found]] == codes[found]
+        return [self.owners[self.offsets[p]:self.offsets[p + 1]] for p in positions[found].tolist()]
+
+    def _common(self, codes):
+        """
+        Ids of titles containing any of the trigram codes, sorted, and how many of the codes each of them contains
+        """
+        postings = self._postings(codes)
+        if not postings:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        ids = np.concatenate(postings)
+        if len(ids) < len(self.titles):
+            # sorting the ids is cheaper than counting over all titles
+            ids = np.sort(ids)
+            starts = self.starts(ids)
+            return ids[starts], np.diff(np.append(starts, len(ids)))
+        counts = np.bincount(ids, minlength=len(self.titles))
+        ids = np.flatnonzero(counts > 0)
+        return ids, counts[ids]
+
+    def _prefixed(self, query):
+        start = bisect.bisect_left(self.sorted_folded, query)
+        end = bisect.bisect_left(self.sorted_folded, query + "\U0010ffff", start)
+        return self.sorted_ids[start:end]
+
+    def _with_tokens(self, query):
+        words = query.split()
+        if not words or any(word not in self.tokens for word in words):
+            return []
+        ids = self.tokens[words[0]]
+        for word in words[1:]:
+            ids = np.intersect1d(ids, self.tokens[word], assume_unique=True)
+        return ids.tolist()
+
+    def prepare(self):
+        """
+        Builds what is otherwise built by the first search needing it, so that search doesn't wait for it
+        """
+        if self.deletes is None:
+            deletes = defaultdict(list)
+            for token in self.tokens:
+                if len(token) >= self.MIN_TYPO_LENGTH - 1:
+                    for deleted in self._deleted(token) | {token}:
+                        deletes[deleted].append(token)
+            self.deletes = deletes
+
+    @staticmethod
+    def _deleted(word):
+        return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+    def _neighbors(self, word):
+        """
+        Indexed words one insertion, deletion, substitution or transposition away from word
+        """
+        self.prepare()
+        neighbors = set()
+        for deleted in self._deleted(word) | {word}:
+            neighbors.update(self.deletes.get(deleted, ()))
+        return neighbors
+
+    def _with_typos(self, query):
+        """
+        Ids of titles having every query word or a word one typo away from it
+        """
+        ids = None
+        for word in query.split():
+            if word in self.tokens:
+                word_ids = self.tokens[word]
+            elif len(word) >= self.MIN_TYPO_LENGTH:
+                postings = [self.tokens[neighbor] for neighbor in self._neighbors(word)]
+                word_ids = self.distinct(np.concatenate(postings)) if postings else np.zeros(0, dtype=np.int64)
+            else:
+                return np.zeros(0, dtype=np.int64)
+            ids = word_ids if ids is None else np.intersect1d(ids, word_ids, assume_unique=True)
+        return ids if ids is not None else np.zeros(0, dtype=np.int64)
+
+    def _containing_short(self, query):
+        """
+        Ids of titles containing a query too short to have trigrams of its own
+        """
+        data = query.encode()
+        if len(data) == 2:
+            # every occurrence is followed by another character, trigrams starting with it are a range of codes
+            start = data[0] << 16 | data[1] << 8
+            low, high = np.searchsorted(self.grams, [start, start + 256])
+            return self.distinct(self.owners[self.offsets[low]:self.offsets[high]])
+        # titles are padded, so every character of a title is the middle of one of its trigrams
+        middle = (self.grams >> 8 & 0xff) == data[0]
+        return self.distinct(self.owners[np.repeat(middle, np.diff(self.offsets))])
+
+    def search(self, query, limit=None, fuzzy=True):
+        """
+        Returns titles matching query, best match first. Without fuzzy titles that are only similar are left out.
+        """
+        query = query.strip().lower()
+        if not query or not self.titles:
+            return []
+        codes = self.distinct(self.codes(f" {query} ".encode()))
+        inner = self.distinct(self.codes(query.encode()))
+        ids, common = self._common(codes)
+        # trigrams at the edges of the query only match at the edges of words, a substring may not contain them
+        edge_ids, edge_common = self._common(np.setdiff1d(codes, inner, assume_unique=True))
+        inner_common = common.copy()
+        inner_common[np.searchsorted(ids, edge_ids)] -= edge_common
+        typos = self._with_typos(query) if fuzzy else np.zeros(0, dtype=np.int64)
+        short = len(query.encode()) < 3
+        contained = self._containing_short(query) if short else np.zeros(0, dtype=np.int64)
+        missing = np.setdiff1d(self.distinct(np.concatenate((typos, contained))), ids, assume_unique=True)
+        if len(missing):
+            # a typo or a short query can leave a title without trigrams in common with the query
+            order = np.argsort(np.concatenate((ids, missing)))
+            ids = np.concatenate((ids, missing))[order]
+            common = np.concatenate((common, np.zeros(len(missing), dtype=common.dtype)))[order]
+            inner_common = np.concatenate((inner_common, np.zeros(len(missing), dtype=common.dtype)))[order]
+        similarity = 2 * common / (len(codes) + self.trigram_counts[ids])
+
+        kinds = np.full(len(ids), -1)
+        if short:
+            kinds[np.searchsorted(ids, contained)] = self.SUBSTRING
+        elif len(inner):
+            # titles containing the query contain all of its inner trigrams
+            contains = np.flatnonzero(inner_common >= len(inner))
+            if len(query.encode()) > 3:
+                # trigrams can be in a different order, a query of a single trigram is contained for sure
+                contains = [k for k in contains.tolist() if query in self.folded[ids[k]]]
+            kinds[contains] = self.SUBSTRING
+        tokens = self._with_tokens(query)
+        kinds[np.searchsorted(ids, tokens)] = self.TOKEN
+        prefixed = self._prefixed(query)
+        kinds[np.searchsorted(ids, prefixed)] = self.PREFIX
+        for i in prefixed.tolist():
+            # equal titles sort before longer ones starting with them
+            if self.folded[i] != query:
+                break
+            kinds[np.searchsorted(ids, i)] = self.EXACT
+        if fuzzy:
+            similar = similarity >= self.MIN_SIMILARITY
+            similar[np.searchsorted(ids, typos)] = True
+            kinds[(kinds < 0) & similar] = self.FUZZY
+        matches = np.flatnonzero(kinds >= 0)
+        score = kinds[matches] + similarity[matches]  # similarity is at most 1, so the kind of match decides first
+        if limit is not None and limit < len(matches):
+            # titles scoring the same as the last one kept are ranked by the tie-break too, so all of them are kept
+            cutoff = -np.partition(-score, limit - 1)[limit - 1]
+            top = score >= cutoff
+            matches, score = matches[top], score[top]
+        ranked = sorted(zip((-score).tolist(), ids[matches].tolist()),
+                        key=lambda match: (match[0], len(self.folded[match[1]]), self.folded[match[1]]))
+        return [self.titles[i] for _, i in ranked[:limit]]
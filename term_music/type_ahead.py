@@ -0,0 +1,70 @@
+import logging
+from threading import Event, Lock
+
+from term_music.app_data import Data
+
+logger = logging.getLogger(__name__)
+
+
+class TypeAhead:
+    """
+    Search worker, run searches the text typed in query mode until stop is called.
+    Text typed while a search runs replaces text that wasn't searched yet, so only the latest text is searched.
+    Results are dropped if the text changed while they were searched.
+    prepare is called by the worker when query mode starts, so the first keys typed don't wait for the search index
+    to be built.
+    """
+
+    def __init__(self, data: Data, search, limit=15, prepare=None):
+        self.data = data
+        self.search = search
+        self.limit = limit
+        self.prepare = prepare
+        self.preparing = False
+        self.text = None  # latest text typed and not searched yet
+        self.lock = Lock()
+        self.pending = Event()
+        self.stopped = False
+
+    def start(self):
+        """
+        Called when query mode starts
+        """
+        with self.lock:
+            self.preparing = self.prepare is not None
+        self.pending.set()
+
+    def type(self, text):
+        self.data.set_query_text(text)
+        with self.lock:
+            self.text = text
+        self.pending.set()
+
+    def stop(self):
+        self.stopped = True
+        self.pending.set()
+
+    def run(self):
+        while True:
+            self.pending.wait()
+            if self.stopped:
+                return
+            with self.lock:
+                preparing, self.preparing = self.preparing, False
+            if preparing:
+                try:
+                    self.prepare()
+                except Exception:
+                    logger.debug("Preparing search failed", exc_info=True)
+            # text typed while preparing replaced the text typed before
+            with self.lock:
+                text, self.text = self.text, None
+                self.pending.clear()
+            if text is None:
+                continue
+            try:
+                results = self.search(text, self.limit) if text.strip() else []
+            except Exception:
+                logger.debug("Searching %s failed", text, exc_info=True)
+                results = []
+            self.data.set_query_results(text, results)
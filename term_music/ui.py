@@ -1,29 +1,66 @@
 import logging
 import os.path
-import time
+from queue import Queue, Empty
+from threading import Event
 
 import numpy as np
 from blessed import Terminal
 from pydub import AudioSegment
-from pygame import mixer
 
-from term_music.app_data import Data
+from term_music.app_data import Data, Query, Snapshot
+from term_music.clock import MixerClock
+from term_music.domain.song import Song
+from term_music.frame_stream import FrameStream
+from term_music.profiler import PROFILER
+from term_music.screen import Screen
 
 logger = logging.getLogger(__name__)
 
 
 class UserInterface:
+    """
+    Renderer worker, run renders the song it was last asked to show until QUIT.
+    LIST renders the song list (or the query typed in query mode) on its own while no song is played.
+    Frames are written to output (standard output by default) and follow the playback position of clock, the mixer by
+    default. A MemorySink and a SimulatedClock render without a terminal or an audio device.
+    """
+    SHOW = "SHOW"
+    LIST = "LIST"
+    HIDE = "HIDE"
+    QUIT = "QUIT"
+    WAVE = "wave"
+    SPECTRUM = "spectrum"
+    # spectrum settings
+    FFT_WINDOW = 0.046  # seconds of audio in a spectrum frame, rounded up to a power of two samples
+    FFT_BATCH = 256  # frames transformed at once, bounds memory used when the whole song is a single chunk
+    MIN_FREQUENCY = 40
+    MAX_FREQUENCY = 16000
+    DYNAMIC_RANGE = 60  # dB shown between an empty and a full column
+    # frame rate adapts so drawing takes at most 1 / DRAW_HEADROOM of the time
+    DRAW_HEADROOM = 2
+    DRAW_COST_SMOOTHING = 0.1
 
-    def __init__(self, data: Data, terminal: Terminal, fps=60, height=15, width=30, print_char="#"):
+    def __init__(self, data: Data, terminal: Terminal, fps=60, height=15, width=30, print_char="#", mode=WAVE,
+                 analysis_rate=11025, output=None, clock=None):
+        if mode not in (self.WAVE, self.SPECTRUM):
+            raise ValueError(f"Unknown visualizer mode {mode}, expected one of {self.WAVE}, {self.SPECTRUM}")
         self.data = data
         self.fps = fps
         self.width = width
         self.height = height
         self.print_char = print_char
+        self.mode = mode
+        # frames are computed from mono audio decoded at this sample rate, separately from playback
+        self.analysis_rate = analysis_rate
+        # heights never exceed self.height so frames are kept in the smallest int type that fits it
+        self.frame_dtype = np.min_scalar_type(height)
         self.t = terminal
-        self.stop = False
-        self.paused = False
+        self.output = output
+        self.clock = clock or MixerClock()
+        self.screen = Screen(terminal, output)
+        self.commands = Queue()
         self.skipped_frames = 0
+        self.drawn_frames = 0
         self.interval = 1 / fps
 
     @staticmethod
@@ -34,65 +71,285 @@ class UserInterface:
             return "%d:%02d:%02d" % (h, m, s)
         return "%d:%02d" % (m, s)
 
-    def terminate(self):
-        self.stop = True
+    def show(self, frames: FrameStream, duration: float):
+        self.commands.put((self.SHOW, (frames, duration)))
 
-    def pause(self):
-        self.paused = True
+    def show_list(self):
+        self.commands.put((self.LIST, None))
 
-    def unpause(self):
-        self.stop = False
-        self.paused = False
+    def hide(self):
+        """
+        Stops rendering and clears the screen, returns once the screen is cleared
+        """
+        done = Event()
+        self.commands.put((self.HIDE, done))
+        done.wait()
+
+    def quit(self):
+        self.commands.put((self.QUIT, None))
 
     def clear(self):
-        print(self.t.home + self.t.clear)
+        print(self.t.home + self.t.clear, file=self.output, flush=True)
+        self.screen.invalidate()
 
     def draw_frame(self, frame):
-        for i, height in enumerate(frame):
-            for j in range(int(height)):
-                print(self.t.move_yx(self.height - j - 1, i) + self.print_char)
+        self.screen.bars(frame, self.height, self.print_char)
+
+    def draw_query(self, query: Query, x):
+        """
+        Draws the typed text in the first line, matching titles below it and key hints in the last line
+        """
+        max_width = max(self.t.width - x, 0)
+        self.screen.line(0, x, f"Search: {query.text}"[:max_width])
+        for i, title in enumerate(query.results[:max(self.height - 2, 1)]):
+            color = self.t.blue if i == query.selected else self.t.snow4
+            self.screen.line(i + 1, x, color(title[:max_width]))
+        self.screen.line(max(self.height - 1, 1), x,
+                         self.t.snow4("enter - play, tab - search youtube, esc - cancel"[:max_width]))
 
-    def draw_song_list(self, duration, elapsed):
+    def draw_song_list(self, snapshot: Snapshot, duration, elapsed):
+        if snapshot.query is not None:
+            self.draw_query(snapshot.query, self.width)
+            return
         max_width = self.t.width - self.width
-        start = (self.data.get_selected() // self.height) * self.height
-        end = min(start + self.height, self.data.length())
+        start = (snapshot.selected // self.height) * self.height
+        end = min(start + self.height, snapshot.length())
         for i in range(start, end):
-            song = self.data.path_at(i)
-            title = os.path.basename(song)
-            with self.t.location(self.width, i - start):
-                if self.data.get_current() == i:
-                    clock_str = f" {elapsed}/{duration}"
-                    print(self.t.green(title[:max_width - len(clock_str)] + clock_str))
-                elif self.data.get_selected() == i:
-                    print(self.t.blue(title[:max_width]))
-                else:
-                    print(self.t.snow4(title[:max_width]))
+            title = os.path.basename(snapshot.path_at(i))
+            if snapshot.current == i:
+                clock_str = f" {elapsed}/{duration}"
+                line = self.t.green(title[:max_width - len(clock_str)] + clock_str)
+            elif snapshot.selected == i:
+                line = self.t.blue(title[:max_width])
+            else:
+                line = self.t.snow4(title[:max_width])
+            self.screen.line(i - start, self.width, line)
 
     def get_frames(self, segment: AudioSegment):
-        data = np.frombuffer(segment.raw_data, dtype=np.int16)
-        x = np.linspace(0, data.size - 1, int(segment.duration_seconds * self.fps * self.width))
-        xp = np.linspace(0, data.size - 1, data.size)
-        frames = np.ceil(np.abs(np.interp(x, xp, data)) * (self.height / segment.max_possible_amplitude))
-        return frames
+        """
+        Computes all frames of the segment at once, returns array of shape (frames, self.width)
+        """
+        with PROFILER.span("get_frames", "frames"):
+            segment = segment.set_channels(1).set_frame_rate(self.analysis_rate)
+            blocks = list(self.stream_frames([segment.raw_data], segment.frame_rate, segment.channels,
+                                             segment.max_possible_amplitude))
+        if not blocks:
+            return np.zeros((0, self.width), dtype=self.frame_dtype)
+        return np.concatenate(blocks)
 
-    def render(self, frames, duration: float):
-        with self.t.hidden_cursor():
-            print(self.t.clear)
-            current_frame = 0
-            duration_str = self.format_time(duration)
-            while not self.stop and self.data.running() and ((current_frame * self.width) < len(frames)):
-                frame_start = time.time()
-                elapsed_str = self.format_time(min(mixer.music.get_pos() / 1000, duration))
+    def frame_settings(self):
+        """
+        Settings that frames depend on, used to key cached frames
+        """
+        return self.fps, self.width, self.height, self.mode, self.analysis_rate
+
+    def song_frames(self, song: Song, start=0):
+        """
+        Streams frame blocks of the song from frame start, song is decoded at analysis rate for this
+        """
+        chunks = song.stream(start / self.fps, self.analysis_rate, 1)
+        return self.stream_frames(chunks, self.analysis_rate, 1)
+
+    def stream_frames(self, chunks, frame_rate, channels, max_amplitude=2 ** 15):
+        """
+        Reduces chunks of 16 bit pcm data to frames of the configured mode as the chunks come in.
+        Yields blocks of frames, arrays of shape (frames, self.width)
+        """
+        if self.mode == self.SPECTRUM:
+            return self.spectrum_frames(chunks, frame_rate, channels, max_amplitude)
+        return self.wave_frames(chunks, frame_rate, channels, max_amplitude)
+
+    def wave_frames(self, chunks, frame_rate, channels, max_amplitude=2 ** 15):
+        """
+        Every frame column is the (linearly interpolated) amplitude at evenly spaced points of the stream,
+        only arrays the size of a single chunk are held at any time.
+        """
+        step = frame_rate * channels / (self.fps * self.width)
+        scale = self.height / max_amplitude
+        column = 0  # index of the next column to compute
+        offset = 0  # stream position of the first sample in buffer
+        carry = np.zeros(0, dtype=np.int16)
+        pending = np.zeros(0, dtype=self.frame_dtype)
+        for chunk in chunks:
+            samples = np.frombuffer(chunk, dtype=np.int16, count=len(chunk) // 2)
+            buffer = np.concatenate((carry, samples)) if carry.size else samples
+            if buffer.size == 0:
+                continue
+            last = offset + buffer.size - 1
+            count = int((last - column * step) // step) + 1
+            if count > 0:
+                x = (column + np.arange(count)) * step - offset
+                i = x.astype(np.int64)
+                i_next = np.minimum(i + 1, buffer.size - 1)
+                values = buffer[i] + (buffer[i_next] - buffer[i].astype(np.float64)) * (x - i)
+                columns = np.ceil(np.abs(values) * scale).astype(self.frame_dtype)
+                column += count
+                pending = np.concatenate((pending, columns)) if pending.size else columns
+                full = pending.size // self.width * self.width
+                if full:
+                    yield pending[:full].reshape(-1, self.width)
+                    pending = pending[full:]
+            # last sample is needed to interpolate columns falling between this and the next chunk
+            carry = buffer[-1:]
+            offset = last
+
+    def fft_size(self, frame_rate):
+        return 1 << int(np.ceil(np.log2(self.FFT_WINDOW * frame_rate)))
+
+    def spectrum_bands(self, frame_rate):
+        """
+        Returns first fft bin of each column, columns are spaced evenly on a log frequency scale
+        """
+        fft_size = self.fft_size(frame_rate)
+        bins = fft_size // 2 + 1
+        max_frequency = min(self.MAX_FREQUENCY, frame_rate / 2)
+        edges = np.geomspace(self.MIN_FREQUENCY, max_frequency, self.width + 1)
+        first = np.floor(edges * fft_size / frame_rate).astype(np.int64)
+        # every column gets at least one bin, low columns are narrower than a bin
+        first = np.minimum(np.maximum.accumulate(first), bins - 1)
+        last = np.minimum(np.maximum(first[1:], first[:-1] + 1), bins)
+        return first[:-1], int(last[-1])
+
+    def spectrum_frames(self, chunks, frame_rate, channels, max_amplitude=2 ** 15):
+        """
+        Every frame is the log frequency magnitude spectrum of a hann windowed block of samples starting at the frame
+        position. Frames of a chunk are transformed together with batched ffts.
+        """
+        hop = frame_rate / self.fps
+        fft_size = self.fft_size(frame_rate)
+        window = np.hanning(fft_size)
+        # magnitude of a full scale sine, top of the column
+        reference = window.sum() / 2 * max_amplitude
+        scale = self.height / self.DYNAMIC_RANGE
+        first_bins, last_bin = self.spectrum_bands(frame_rate)
+        frame = 0  # index of the next frame to compute
+        offset = 0  # stream position of the first sample in buffer
+        buffer = np.zeros(0, dtype=np.float32)
+        for chunk in chunks:
+            samples = np.frombuffer(chunk, dtype=np.int16, count=len(chunk) // 2)
+            samples = samples[:samples.size // channels * channels].reshape(-1, channels).mean(axis=1)
+            buffer = np.concatenate((buffer, samples.astype(np.float32)))
+            count = int((offset + buffer.size - fft_size) // hop) - frame + 1
+            if count <= 0:
+                continue
+            blocks = np.lib.stride_tricks.sliding_window_view(buffer, fft_size)
+            for batch in range(0, count, self.FFT_BATCH):
+                frames = np.arange(frame + batch, frame + min(batch + self.FFT_BATCH, count))
+                starts = np.round(frames * hop).astype(np.int64) - offset
+                magnitudes = np.abs(np.fft.rfft(blocks[starts] * window, axis=1)[:, :last_bin])
+                bands = np.maximum.reduceat(magnitudes, first_bins, axis=1)
+                db = 20 * np.log10(np.maximum(bands / reference, 1e-12))
+                yield np.clip(np.ceil((db + self.DYNAMIC_RANGE) * scale), 0, self.height).astype(self.frame_dtype)
+            frame += count
+            # keep samples the next frame's block starts at
+            keep = int(round(frame * hop)) - offset
+            buffer = buffer[keep:]
+            offset += keep
+
+    def frames_duration(self, frames):
+        return len(frames) / self.fps
+
+    def frames_nbytes(self, duration):
+        return int(duration * self.fps) * self.width * self.frame_dtype.itemsize
+
+    def position(self):
+        """
+        Playback position of the current song in milliseconds, the clock frames are rendered by
+        """
+        return self.clock.position()
+
+    def run(self):
+        command = None
+        while True:
+            if command is None:
+                command = self.commands.get()
+            name, argument = command
+            command = None
+            if name == self.QUIT:
+                return
+            elif name == self.SHOW:
+                command = self.render(*argument)
+            elif name == self.LIST:
+                command = self.render_list()
+            elif name == self.HIDE:
                 self.clear()
-                if not self.paused:
-                    f = frames[current_frame * self.width:(current_frame + 1) * self.width]
-                    current_frame += 1
-                self.draw_frame(f)
-                self.draw_song_list(duration_str, elapsed_str)
-                sleep_for = frame_start + self.interval - time.time()
-                if sleep_for > 0:
-                    time.sleep(sleep_for)
+                argument.set()
+
+    def render_list(self):
+        """
+        Renders the song list without a visualizer, drawn again only when data changes.
+        Returns the command that interrupted rendering.
+        """
+        with self.t.hidden_cursor():
+            self.screen.clear()
+            list_drawn = None
+            while True:
+                snapshot = self.data.snapshot()
+                if list_drawn == snapshot.version:
+                    self.screen.keep_lines()
                 else:
-                    self.skipped_frames += 1
-        self.stop = False
-        self.paused = False
+                    self.draw_song_list(snapshot, "", "")
+                    list_drawn = snapshot.version
+                self.screen.flush()
+                try:
+                    command = self.clock.wait(self.commands, 1 / self.fps)
+                except Empty:
+                    continue
+                if command[0] != self.LIST:
+                    return command
+
+    def render(self, frames: FrameStream, duration: float):
+        """
+        Renders the frame matching the playback position, frames that weren't drawn in time are dropped.
+        Target frame rate is lowered when drawing a frame takes longer than the configured fps allows.
+        Returns the command that interrupted rendering or None if the song ended.
+        """
+        try:
+            with self.t.hidden_cursor():
+                self.screen.clear()
+                terminal_size = (self.t.width, self.t.height)
+                duration_str = self.format_time(duration)
+                last_index = -1
+                draw_cost = 0.0
+                # song list is only drawn again when the queue or the elapsed time changed
+                list_drawn = None
+                while self.data.running():
+                    frame_start = self.clock.time()
+                    position = self.position()
+                    index = int(position / 1000 * self.fps)
+                    f = frames.get(index)
+                    if f is None:
+                        break
+                    if index > last_index + 1:
+                        self.skipped_frames += index - last_index - 1
+                        PROFILER.counter("skipped frames", self.skipped_frames, "ui")
+                    last_index = index
+                    if terminal_size != (self.t.width, self.t.height):
+                        # terminal was resized, back buffer no longer matches what is on the screen
+                        terminal_size = (self.t.width, self.t.height)
+                        self.screen.clear()
+                        list_drawn = None
+                    draw_start = self.clock.time()
+                    with PROFILER.span("render frame", "ui", index=index):
+                        self.draw_frame(f)
+                        snapshot = self.data.snapshot()
+                        elapsed_str = self.format_time(min(position / 1000, duration))
+                        if list_drawn == (snapshot.version, elapsed_str):
+                            self.screen.keep_lines()
+                        else:
+                            self.draw_song_list(snapshot, duration_str, elapsed_str)
+                            list_drawn = (snapshot.version, elapsed_str)
+                        self.screen.flush()
+                    self.drawn_frames += 1
+                    self.clock.frame_drawn()
+                    draw_cost += (self.clock.time() - draw_start - draw_cost) * self.DRAW_COST_SMOOTHING
+                    self.interval = max(1 / self.fps, draw_cost * self.DRAW_HEADROOM)
+                    try:
+                        # waiting for the next frame, unless another command comes in
+                        return self.clock.wait(self.commands, max(frame_start + self.interval - self.clock.time(), 0))
+                    except Empty:
+                        pass
+        finally:
+            # decoding of the rest of the song resumes if the song is rendered again
+            frames.suspend()
+        return None
@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+import wave
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from term_music.extractor import YoutubeExtractor
+from term_music.library_index import LibraryIndex
+
+
+@pytest.fixture
+def tone(tmp_path):
+    """
+    Writes a 16 bit mono wav file of a sine tone, returns its path
+    """
+    def write(seconds=2, frequency=220, rate=44100):
+        path = os.path.join(tmp_path, f"tone {frequency}.wav")
+        t = np.arange(int(seconds * rate)) / rate
+        with wave.open(path, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(rate)
+            w.writeframes((np.sin(2 * np.pi * frequency * t) * 0.5 * (2 ** 15 - 1)).astype(np.int16).tobytes())
+        return path
+    return write
+
+
+class FakeExtractor:
+    """
+    Extractor that finds a song titled after the query, aliases map queries to the title of another one.
+    Downloads write a small file, converting moves it into place, neither needs ffmpeg or the network.
+    delays are seconds the download of a title takes, failures are how many times a (stage, title) fails before it
+    works. calls counts (stage, title) calls.
+    """
+    DOWNLOAD_SUFFIX = YoutubeExtractor.DOWNLOAD_SUFFIX
+    STAGING_FOLDER = YoutubeExtractor.STAGING_FOLDER
+
+    def __init__(self, folder, aliases=None, delays=None, failures=None):
+        self.folder = folder
+        self.staging = os.path.join(folder, self.STAGING_FOLDER)
+        os.makedirs(self.staging, exist_ok=True)
+        self.aliases = aliases or {}
+        self.delays = delays or {}
+        self.failures = failures or {}
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.converted = []  # titles in the order they were converted
+
+    def _call(self, stage, title):
+        with self.lock:
+            self.calls[stage, title] += 1
+            fail = self.calls[stage, title] <= self.failures.get((stage, title), 0)
+        if fail:
+            raise OSError(f"{stage} of {title} failed")
+
+    def search(self, query):
+        title = self.aliases.get(query, query)
+        self._call("search", title)
+        return f"id-{title}", title, f"https://videos/{title}"
+
+    def download(self, url):
+        title = url.rsplit("/", 1)[1]
+        self._call("download", title)
+        time.sleep(self.delays.get(title, 0))
+        path = os.path.join(self.staging, title + self.DOWNLOAD_SUFFIX + ".wav")
+        with open(path, "wb") as f:
+            f.write(b"audio")
+        return title, path
+
+    def convert(self, source, filename, place=None):
+        title = filename[:-4]
+        self._call("convert", title)
+        if place:
+            place(source, filename)
+        else:
+            os.replace(source, os.path.join(self.folder, filename))
+        with self.lock:
+            self.converted.append(title)
+
+
+@pytest.fixture
+def library(tmp_path):
+    """
+    Empty music library folder and its index
+    """
+    folder = tmp_path / "music"
+    folder.mkdir()
+    index = LibraryIndex(str(tmp_path / "library.db"), str(folder))
+    yield str(folder), index
+    index.close()
+
+
+@pytest.fixture
+def fake_extractor():
+    """
+    Makes FakeExtractors, see FakeExtractor
+    """
+    return FakeExtractor
@@ -0,0 +1,25 @@
+from term_music.app_data import Data
+
+PATHS = ["/music/a.mp3", "/music/b.mp3", "/other/a.mp3", "c.mp3", "/music/a.mp3", "/music/b.mp3"]
+
+
+def test_queue_keeps_paths():
+    data = Data()
+    for path in PATHS:
+        data.add_song(path)
+    data.insert_song_after_current("/music/first.mp3")
+    snapshot = data.snapshot()
+    assert [snapshot.path_at(i) for i in range(snapshot.length())] == ["/music/first.mp3"] + PATHS
+    assert data.get_song_names() == ["first", "a", "b", "a", "c", "a", "b"]
+
+
+def test_dedupe_removes_repeated_paths():
+    data = Data()
+    for path in PATHS:
+        data.add_song(path)
+    data.set_current(4)
+    data.dedupe()
+    # repeated /music/a.mp3 before the current song goes, the current one stays
+    assert [data.path_at(i) for i in range(data.length())] == ["/music/b.mp3", "/other/a.mp3", "c.mp3",
+                                                                 "/music/a.mp3"]
+    assert data.get_current() == 3
@@ -0,0 +1,19 @@
+from term_music.db import open_db
+
+TABLES = {"songs": ["CREATE TABLE IF NOT EXISTS songs (title TEXT PRIMARY KEY)",
+                    "CREATE INDEX IF NOT EXISTS songs_title ON songs (title)"]}
+
+
+def test_tables_are_kept_until_version_changes(tmp_path):
+    path = str(tmp_path / "nested" / "test.db")
+    db = open_db(path, 1, TABLES)
+    with db:
+        db.execute("INSERT INTO songs VALUES ('Song')")
+    db.close()
+    db = open_db(path, 1, TABLES)
+    assert db.execute("SELECT title FROM songs").fetchall() == [("Song",)]
+    db.close()
+    db = open_db(path, 2, TABLES)
+    assert db.execute("SELECT title FROM songs").fetchall() == []
+    assert db.execute("PRAGMA user_version").fetchone()[0] == 2
+    db.close()
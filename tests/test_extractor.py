@@ -0,0 +1,45 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from term_music.extractor import YoutubeExtractor
+
+
+def interrupted_run(command, **kwargs):
+    """
+    Writes part of the output file, then is interrupted the way ctrl+c interrupts ffmpeg
+    """
+    with open(command[-1], "wb") as f:
+        f.write(b"\xff\xfb" * 100)
+    raise KeyboardInterrupt
+
+
+def test_interrupted_convert_leaves_no_song(tmp_path, monkeypatch):
+    extractor = YoutubeExtractor(str(tmp_path))
+    os.makedirs(extractor.staging)
+    source = os.path.join(extractor.staging, "Song.download.webm")
+    open(source, "wb").close()
+    monkeypatch.setattr(subprocess, "run", interrupted_run)
+    with pytest.raises(KeyboardInterrupt):
+        extractor.convert(source, "Song.mp3")
+    assert os.listdir(tmp_path) == [YoutubeExtractor.STAGING_FOLDER]
+    assert os.listdir(extractor.staging) == ["Song.download.webm"]
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is needed to convert")
+def test_convert_moves_the_mp3_into_place(tmp_path, tone):
+    folder = tmp_path / "music"
+    folder.mkdir()
+    placed = []
+
+    def place(path, filename):
+        placed.append(filename)
+        os.replace(path, os.path.join(folder, filename))
+    extractor = YoutubeExtractor(str(folder))
+    extractor.convert(tone(), "Song.mp3", place)
+    assert placed == ["Song.mp3"]
+    assert sorted(os.listdir(folder)) == [YoutubeExtractor.STAGING_FOLDER, "Song.mp3"]
+    assert os.listdir(extractor.staging) == []
+    assert os.path.getsize(folder / "Song.mp3") > 0
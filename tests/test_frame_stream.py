@@ -0,0 +1,69 @@
+import threading
+import time
+
+import numpy as np
+
+from term_music.app_data import Data
+from term_music.frame_stream import FrameStream
+from term_music.prefetch import Prefetcher
+
+WIDTH = 4
+
+
+def slow_source(blocks=None, delay=0.02):
+    """
+    Source of blocks of a single frame, each taking delay seconds, endless without blocks
+    """
+    def source(start):
+        index = start
+        while blocks is None or index < blocks:
+            time.sleep(delay)
+            yield np.full((1, WIDTH), index % 256, dtype=np.uint8)
+            index += 1
+    return source
+
+
+def test_frames_can_be_read_while_stream_is_filled():
+    frames = FrameStream(slow_source(blocks=50), WIDTH, np.uint8)
+    filling = threading.Thread(target=frames.fill)
+    filling.start()
+    start = time.monotonic()
+    assert frames.get(0)[0] == 0
+    waited = time.monotonic() - start
+    assert not frames.done()
+    filling.join()
+    assert frames.done() and frames.length == 50
+    # the whole fill takes a second, reading the first frame waits for a block or two
+    assert waited < 0.5
+
+
+def test_fill_stops_when_stream_is_closed():
+    frames = FrameStream(slow_source(), WIDTH, np.uint8)
+    filling = threading.Thread(target=frames.fill)
+    filling.start()
+    time.sleep(0.1)
+    frames.close()
+    filling.join(1)
+    assert not filling.is_alive()
+
+
+def test_prefetcher_shutdown_stops_preparing(tmp_path):
+    path = tmp_path / "song.mp3"
+    path.write_bytes(b"")
+    data = Data()
+    data.add_song("current.mp3")
+    data.add_song(str(path))
+    data.inc_current()
+    started = threading.Event()
+
+    def load_frames(song):
+        started.set()
+        return FrameStream(slow_source(), WIDTH, np.uint8), 0
+
+    prefetcher = Prefetcher(data, load_frames, depth=1)
+    prefetcher.prefetch()
+    future = prefetcher.futures[str(path)]
+    assert started.wait(1)
+    prefetcher.shutdown()
+    # endless stream would never finish filling if it wasn't closed
+    assert future.result(timeout=1).done()
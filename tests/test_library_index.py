@@ -0,0 +1,65 @@
+import os
+import time
+
+from term_music.library_index import LibraryIndex, SONG
+
+
+def write(folder, filename):
+    # folder mtime has to move, its resolution can be as coarse as a clock tick
+    time.sleep(0.02)
+    open(os.path.join(folder, filename), "w").close()
+
+
+def titles(index):
+    return sorted(index.titles(SONG))
+
+
+def test_file_written_outside_while_app_writes_is_found(tmp_path):
+    folder = str(tmp_path / "music")
+    os.mkdir(folder)
+    write(folder, "a.mp3")
+    db = str(tmp_path / "library.db")
+    index = LibraryIndex(db, folder)
+    index.refresh()
+    write(folder, "outside.mp3")
+    before = index.state()
+    write(folder, "downloaded.mp3")
+    index.add("downloaded.mp3", before)
+    index.refresh()
+    assert titles(index) == ["a", "downloaded", "outside"]
+    index.close()
+    assert titles(LibraryIndex(db, folder)) == ["a", "downloaded", "outside"]
+
+
+def test_add_without_state_is_found_by_next_refresh(tmp_path):
+    index = LibraryIndex(":memory:", str(tmp_path))
+    index.refresh()
+    write(str(tmp_path), "outside.mp3")
+    write(str(tmp_path), "downloaded.mp3")
+    index.add("downloaded.mp3")
+    index.refresh()
+    assert titles(index) == ["downloaded", "outside"]
+
+
+def test_place_keeps_state_when_only_the_app_wrote(tmp_path):
+    folder = str(tmp_path / "music")
+    os.mkdir(folder)
+    index = LibraryIndex(":memory:", folder)
+    index.refresh()
+    write(str(tmp_path), "song.part")
+    index.place(str(tmp_path / "song.part"), "song.mp3")
+    assert index._stored_state() == index.state()
+    assert titles(index) == ["song"]
+
+
+def test_place_leaves_state_stale_after_outside_write(tmp_path):
+    folder = str(tmp_path / "music")
+    os.mkdir(folder)
+    index = LibraryIndex(":memory:", folder)
+    index.refresh()
+    write(folder, "outside.mp3")
+    write(str(tmp_path), "song.part")
+    index.place(str(tmp_path / "song.part"), "song.mp3")
+    assert index._stored_state() != index.state()
+    index.refresh()
+    assert titles(index) == ["outside", "song"]
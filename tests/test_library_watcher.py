@@ -0,0 +1,60 @@
+import os
+import threading
+import time
+
+import pytest
+
+from term_music.library_index import SONG
+from term_music.library_watcher import Inotify, LibraryWatcher
+
+
+@pytest.fixture
+def watched(library, monkeypatch):
+    """
+    Library watched with inotify, yields its folder, index and the list of folder scans made after the watch started
+    """
+    folder, index = library
+    try:
+        Inotify(folder).close()
+    except OSError:
+        pytest.skip("inotify is not available")
+    scans = []
+    scan = index._scan
+    watcher = LibraryWatcher(index)
+    worker = threading.Thread(target=watcher.run, daemon=True)
+    worker.start()
+    # the watcher refreshes when it starts, wait for it before counting scans
+    time.sleep(0.2)
+    monkeypatch.setattr(index, "_scan", lambda state: (scans.append(state), scan(state)))
+    yield folder, index, scans
+    watcher.stop()
+    worker.join(2)
+
+
+def indexed(index, filename):
+    """
+    Whether filename is in the index, without refreshing it
+    """
+    with index.lock:
+        return index.db.execute("SELECT 1 FROM files WHERE filename = ?", (filename,)).fetchone() is not None
+
+
+def wait_for(condition, timeout=2):
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_changes_seen_by_the_watcher_are_applied_without_a_scan(watched):
+    folder, index, scans = watched
+    time.sleep(0.02)
+    open(os.path.join(folder, "Song.mp3"), "wb").close()
+    assert wait_for(lambda: indexed(index, "Song.mp3"))
+    assert index.titles(SONG) == ["Song"]
+    os.remove(os.path.join(folder, "Song.mp3"))
+    assert wait_for(lambda: not indexed(index, "Song.mp3"))
+    assert index.titles(SONG) == []
+    assert scans == []
@@ -0,0 +1,101 @@
+import io
+import os
+import threading
+
+import pytest
+
+from term_music.library_index import SONG
+from term_music.load_pipeline import LoadPipeline
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(LoadPipeline, "RETRY_DELAY", 0)
+
+
+def load(index, extractor, queries, check=False, **settings):
+    """
+    Titles the pipeline loads for queries, fails instead of hanging if it never finishes, e.g. on a leaked slot
+    """
+    pipeline = LoadPipeline(index, extractor, progress_stream=io.StringIO(), **settings)
+    titles = []
+    worker = threading.Thread(target=lambda: titles.extend(pipeline.load(queries, check)), daemon=True)
+    worker.start()
+    worker.join(10)
+    assert not worker.is_alive(), "load didn't finish"
+    pipeline.shutdown()
+    return titles, pipeline
+
+
+def test_titles_are_in_query_order_when_songs_finish_out_of_order(library, fake_extractor):
+    folder, index = library
+    extractor = fake_extractor(folder, delays={"a": 0.3, "b": 0.1})
+    titles, _ = load(index, extractor, ["a", "b", "c", "d"], download_workers=4)
+    assert titles == ["a", "b", "c", "d"]
+    assert extractor.converted[-1] == "a"
+    assert sorted(os.listdir(folder)) == [extractor.STAGING_FOLDER, "a.mp3", "b.mp3", "c.mp3", "d.mp3"]
+    assert os.listdir(extractor.staging) == []
+
+
+def test_failed_stages_are_retried(library, fake_extractor):
+    folder, index = library
+    failures = {("search", "a"): 2, ("download", "b"): 1, ("convert", "c"): 2}
+    extractor = fake_extractor(folder, failures=failures)
+    titles, pipeline = load(index, extractor, ["a", "b", "c"], retries=2)
+    assert titles == ["a", "b", "c"]
+    assert extractor.calls["search", "a"] == 3
+    assert extractor.calls["download", "b"] == 2
+    assert extractor.calls["convert", "c"] == 3
+    assert pipeline.progress.retried == 5
+    assert index.contains("c.mp3")
+
+
+def test_song_failing_every_retry_gives_none(library, fake_extractor):
+    folder, index = library
+    failures = {("search", "a"): 3, ("download", "b"): 3, ("convert", "c"): 3}
+    extractor = fake_extractor(folder, failures=failures)
+    titles, pipeline = load(index, extractor, ["a", "b", "c", "d"], retries=2)
+    assert titles == [None, None, None, "d"]
+    assert extractor.calls["search", "a"] == 3
+    assert ("download", "a") not in extractor.calls
+    assert extractor.calls["convert", "c"] == 3
+    assert pipeline.progress.failed == 3
+    assert not index.contains("c.mp3")
+
+
+def test_title_found_twice_is_loaded_once(library, fake_extractor):
+    folder, index = library
+    # both queries are in the pipeline while the song downloads
+    extractor = fake_extractor(folder, aliases={"song live": "song"}, delays={"song": 0.2})
+    titles, pipeline = load(index, extractor, ["song", "song live", "other"], download_workers=4)
+    assert titles == ["song", "song", "other"]
+    assert extractor.calls["download", "song"] == 1
+    assert extractor.calls["convert", "song"] == 1
+    assert pipeline.progress.skipped == 1
+
+
+@pytest.mark.parametrize("max_pending", [1, 3])
+def test_slots_are_released_on_every_error_path(library, max_pending, fake_extractor):
+    folder, index = library
+    (open(os.path.join(folder, "loaded.mp3"), "wb")).close()
+    failures = {("search", "search fails"): 9, ("download", "download fails"): 9, ("convert", "convert fails"): 9}
+    extractor = fake_extractor(folder, aliases={"again": "twice"}, failures=failures, delays={"twice": 0.1})
+    queries = ["search fails", "download fails", "convert fails", "twice", "again", "loaded", "works"] * 2
+    titles, pipeline = load(index, extractor, queries, check=True, retries=0, download_workers=2,
+                            max_pending=max_pending)
+    assert titles == [None, None, None, "twice", "twice", "loaded", "works"] * 2
+    # every slot was given back, none twice (the semaphore is bounded)
+    assert pipeline.slots._value == pipeline.max_pending
+
+
+def test_loaded_songs_are_placed_without_a_rescan(library, monkeypatch, fake_extractor):
+    folder, index = library
+    extractor = fake_extractor(folder)
+    index.refresh()
+    scans = []
+    scan = index._scan
+    monkeypatch.setattr(index, "_scan", lambda state: (scans.append(state), scan(state)))
+    titles, _ = load(index, extractor, ["a", "b"])
+    assert titles == ["a", "b"]
+    assert index.titles(SONG) == ["a", "b"]
+    assert scans == []
@@ -0,0 +1,89 @@
+import io
+import os
+import sqlite3
+
+import pytest
+
+from term_music.app_data import Data
+from term_music.domain.music_library import MusicLibrary
+from term_music.load_pipeline import LoadPipeline
+from term_music.lookup_cache import LookupCache
+
+TTL = 100
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Time the cache sees, moved forward by the test
+    """
+    now = [1000000.0]
+    monkeypatch.setattr("term_music.lookup_cache.time.time", lambda: now[0])
+    return now
+
+
+def test_search_expires_after_ttl(clock):
+    cache = LookupCache(":memory:", ttl=TTL)
+    cache.put("song", "id", "Song", "https://videos/id")
+    clock[0] += TTL - 1
+    assert cache.get("song") == ("id", "Song", "https://videos/id")
+    clock[0] += 2
+    assert cache.get("song") is None
+
+
+def test_expired_searches_are_purged_on_open(tmp_path, clock):
+    path = str(tmp_path / "lookups.db")
+    cache = LookupCache(path, ttl=TTL)
+    cache.put("old", "old id", "Old", "https://videos/old")
+    clock[0] += TTL / 2
+    cache.put("new", "new id", "New", "https://videos/new")
+    cache.close()
+    clock[0] += TTL / 2 + 1
+    LookupCache(path, ttl=TTL).close()
+    with sqlite3.connect(path) as db:
+        assert db.execute("SELECT query FROM searches").fetchall() == [("new",)]
+
+
+def test_queries_differing_in_case_and_whitespace_match():
+    cache = LookupCache(":memory:")
+    cache.put("  Some   Artist - Song ", "id", "Song", "https://videos/id")
+    assert LookupCache.normalize("some artist -\tsong") == LookupCache.normalize("SOME ARTIST - SONG")
+    assert cache.get("some artist -\tSONG") == ("id", "Song", "https://videos/id")
+    assert cache.get("some artist song") is None
+
+
+def test_local_title_is_none_once_file_leaves_index(library):
+    folder, index = library
+    cache = LookupCache(":memory:")
+    open(os.path.join(folder, "Song.mp3"), "wb").close()
+    index.refresh()
+    cache.put_file("id", "Song.mp3")
+    assert cache.local_title(index, "id") == "Song"
+    os.remove(os.path.join(folder, "Song.mp3"))
+    index.remove("Song.mp3")
+    assert cache.local_title(index, "id") is None
+    assert cache.local_title(index, "unknown id") is None
+
+
+def test_pipeline_cache_hit_calls_no_extractor(library, fake_extractor):
+    folder, index = library
+    extractor = fake_extractor(folder)
+    lookups = LookupCache(":memory:")
+    pipeline = LoadPipeline(index, extractor, progress_stream=io.StringIO(), lookups=lookups)
+    assert list(pipeline.load(["song"])) == ["song"]
+    calls = dict(extractor.calls)
+    assert list(pipeline.load([" Song "])) == ["song"]
+    pipeline.shutdown()
+    assert extractor.calls == calls
+    assert pipeline.progress.skipped == 1
+
+
+def test_search_and_download_cache_hit_calls_no_extractor(library, fake_extractor):
+    folder, index = library
+    extractor = fake_extractor(folder)
+    music_lib = MusicLibrary(Data(), folder, index, extractor, LookupCache(":memory:"))
+    assert music_lib.search_and_download("song") == "song"
+    assert os.path.exists(os.path.join(folder, "song.mp3"))
+    calls = dict(extractor.calls)
+    assert music_lib.search_and_download("SONG ") == "song"
+    assert extractor.calls == calls
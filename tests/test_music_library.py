@@ -0,0 +1,16 @@
+import os
+
+from term_music.app_data import Data
+from term_music.domain.music_library import MusicLibrary
+from term_music.domain.playlist import Playlist
+
+
+def test_play_queues_a_song_or_the_songs_of_a_playlist(library):
+    folder, index = library
+    data = Data()
+    music_lib = MusicLibrary(data, folder, index)
+    music_lib.create_playlist("mix", ["b", "c"])
+    music_lib.play("a.mp3")
+    music_lib.play(Playlist.filename("mix"))
+    assert [data.path_at(i) for i in range(data.length())] == [os.path.join(folder, f"{title}.mp3")
+                                                                for title in "abc"]
@@ -0,0 +1,145 @@
+import os
+import shutil
+import threading
+import time
+
+import pytest
+
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
+
+from pygame import mixer
+
+from term_music.app_data import Data
+from term_music.clock import MixerClock
+from term_music.player import Player
+
+
+def wait_for(condition, timeout=2):
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def start_player():
+    """
+    Starts a player running on a worker with the given settings, quits it after the test
+    """
+    workers = []
+
+    def start(**settings):
+        player = Player(Data(), **settings)
+        worker = threading.Thread(target=player.run, daemon=True)
+        worker.start()
+        workers.append((player, worker))
+        return player
+    yield start
+    for player, worker in workers:
+        player.quit()
+        worker.join(2)
+
+
+@pytest.fixture
+def player(start_player):
+    return start_player(crossfade=500)
+
+
+def test_song_plays_before_its_tail_is_decoded(player, tone, monkeypatch):
+    path = tone(seconds=3)
+    decoding = threading.Event()
+    release = threading.Event()
+
+    def decode_tail(tail_path):
+        decoding.set()
+        release.wait(2)
+        return 2500, "tail"
+    monkeypatch.setattr(player, "_decode_tail", decode_tail)
+    player.play(path)
+    assert decoding.wait(2)
+    assert wait_for(lambda: player.current == path)
+    assert player.fade_at is None
+    release.set()
+    assert wait_for(lambda: player.fade_at == 2500)
+    assert player.tail == "tail"
+
+
+def test_tail_of_a_song_no_longer_playing_is_dropped(player, tone, monkeypatch):
+    first, second = tone(seconds=3, frequency=220), tone(seconds=3, frequency=330)
+    release = threading.Event()
+
+    def decode_tail(tail_path):
+        if tail_path == first:
+            release.wait(2)
+        return 2500, tail_path
+    monkeypatch.setattr(player, "_decode_tail", decode_tail)
+    player.play(first)
+    player.play(second)
+    assert wait_for(lambda: player.current == second)
+    # tails are decoded one at a time, the tail of the second song is decoded once the first one is done
+    release.set()
+    assert wait_for(lambda: player.tail == second)
+    time.sleep(0.1)
+    assert player.current == second and player.tail == second
+
+
+@pytest.fixture
+def gapless_player(start_player, monkeypatch):
+    player = start_player(gapless=True, crossfade=500)
+    if not player.gapless:
+        pytest.skip("pygame has no event queue here, gapless playback is off")
+    handed = []
+    monkeypatch.setattr(mixer.music, "queue", handed.append)
+    return player, handed
+
+
+def test_gapless_song_waits_for_the_tail_and_fades(gapless_player, tone, monkeypatch):
+    player, handed = gapless_player
+    first, second = tone(seconds=3, frequency=220), tone(seconds=3, frequency=330)
+    release = threading.Event()
+
+    def decode_tail(tail_path):
+        release.wait(2)
+        return 2500, tail_path
+    monkeypatch.setattr(player, "_decode_tail", decode_tail)
+    # the way the app queues the next song right after playing one
+    player.play(first)
+    player.queue(second)
+    assert wait_for(lambda: player.queued == second)
+    release.set()
+    assert wait_for(lambda: player.fade_at == 2500)
+    assert player.tail == first
+    assert handed == []
+
+
+def test_gapless_song_is_handed_to_mixer_without_a_tail(gapless_player, tone, monkeypatch):
+    player, handed = gapless_player
+    first, second = tone(seconds=3, frequency=220), tone(seconds=3, frequency=330)
+    release = threading.Event()
+
+    def decode_tail(tail_path):
+        release.wait(2)
+        return None
+    monkeypatch.setattr(player, "_decode_tail", decode_tail)
+    player.play(first)
+    player.queue(second)
+    assert wait_for(lambda: player.queued == second)
+    assert handed == []
+    release.set()
+    assert wait_for(lambda: handed == [second])
+    assert player.fade_at is None and player.handed
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is needed to decode the tail")
+def test_decoded_tail_is_crossfade_long(player, tone):
+    fade_at, tail = player._decode_tail(tone(seconds=2))
+    assert fade_at == pytest.approx(1500, abs=50)
+    assert tail.get_length() == pytest.approx(0.5, abs=0.05)
+
+
+def test_player_and_renderer_agree_on_position(monkeypatch):
+    monkeypatch.setattr(MixerClock, "position", staticmethod(lambda: 1234))
+    assert Player.position() == 1234
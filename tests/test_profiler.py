@@ -0,0 +1,25 @@
+import json
+
+from term_music.memory_cache import MemoryCache
+from term_music.profiler import Profiler
+
+
+def test_report_has_last_value_of_counters(tmp_path):
+    profiler = Profiler()
+    profiler.enable()
+    cache = MemoryCache(100, len)
+    for key in ["a", "b", "a"]:
+        cache.get_or_create(key, lambda: key)
+        for stat, value in cache.stats().items():
+            profiler.counter(f"cache {stat}", value)
+    assert profiler.counters() == {"cache entries": 2, "cache size": 2, "cache hits": 1, "cache misses": 2}
+    assert "cache hits" in profiler.report()
+    profiler.export(tmp_path / "trace.json")
+    with open(tmp_path / "trace.json") as f:
+        assert json.load(f)["counters"]["cache misses"] == 2
+
+
+def test_disabled_profiler_records_no_counters():
+    profiler = Profiler()
+    profiler.counter("cache hits", 1)
+    assert profiler.counters() == {}
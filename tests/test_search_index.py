@@ -0,0 +1,21 @@
+import random
+
+import pytest
+
+from term_music.search_index import SearchIndex
+
+
+@pytest.fixture
+def corpus():
+    rng = random.Random(7)
+    letters = "abcé"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(2, 6))) for _ in range(400)]
+
+
+@pytest.mark.parametrize("query", ["ab", "abc", "ca", "é", "bb", "abé"])
+def test_limited_search_is_the_start_of_the_full_search(corpus, query):
+    index = SearchIndex(corpus)
+    everything = index.search(query)
+    for limit in (1, 2, 5, 10, 50):
+        assert index.search(query, limit=limit) == everything[:limit]
+
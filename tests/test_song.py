@@ -0,0 +1,24 @@
+import shutil
+
+import numpy as np
+import pytest
+from blessed import Terminal
+from pydub import AudioSegment
+
+from term_music.app_data import Data
+from term_music.domain.song import Song
+from term_music.ui import UserInterface
+
+
+@pytest.mark.skipif(not shutil.which("ffmpeg"), reason="songs are streamed with ffmpeg")
+@pytest.mark.parametrize("mode", [UserInterface.WAVE, UserInterface.SPECTRUM])
+def test_streamed_frames_equal_frames_of_whole_song(tone, mode):
+    ui = UserInterface(Data(), Terminal(), mode=mode)
+    # at the analysis rate neither ffmpeg nor pydub resample, both get the same samples
+    path = tone(seconds=3, rate=ui.analysis_rate)
+    chunks = list(Song(path).stream(0, ui.analysis_rate, 1))
+    assert len(chunks) > 2
+    assert all(len(chunk) % 2 == 0 for chunk in chunks)
+    streamed = np.concatenate(list(ui.song_frames(Song(path))))
+    whole = ui.get_frames(AudioSegment.from_wav(path))
+    assert np.array_equal(streamed, whole)